@@ -0,0 +1,17 @@
+"""
+Shared pytest fixtures for the Datafetch database checks
+"""
+
+import pytest
+
+from test_odds_implementation import DB_PATH, connect_db
+
+
+@pytest.fixture(scope="session")
+def conn():
+    """One read-only connection for the whole session (warm page cache across tests)"""
+    if not DB_PATH.exists():
+        pytest.skip(f"Database not found: {DB_PATH}")
+    connection = connect_db()
+    yield connection
+    connection.close()
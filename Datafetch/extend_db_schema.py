@@ -88,6 +88,9 @@ def extend_schema(conn):
         )
     ''')
     
+    # Partial index so "active horse" counts only touch horses with runs
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_hcs_active ON horse_career_stats(horse_id) WHERE total_runs > 0')
+    
     logger.info("Creating trainer_stats table...")
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS trainer_stats (
@@ -334,12 +334,14 @@ def create_indexes(conn: sqlite3.Connection) -> None:
     indexes = [
         # Races indexes
         "CREATE INDEX IF NOT EXISTS idx_races_date ON races(date)",
+        "CREATE INDEX IF NOT EXISTS idx_races_date_offtime ON races(date, off_time)",
         "CREATE INDEX IF NOT EXISTS idx_races_course ON races(course)",
         "CREATE INDEX IF NOT EXISTS idx_races_course_id ON races(course_id)",
         "CREATE INDEX IF NOT EXISTS idx_races_region ON races(region)",
         
         # Runners indexes
         "CREATE INDEX IF NOT EXISTS idx_runners_race_id ON runners(race_id)",
+        "CREATE INDEX IF NOT EXISTS idx_runners_race_number ON runners(race_id, CAST(number AS INTEGER))",
         "CREATE INDEX IF NOT EXISTS idx_runners_horse_id ON runners(horse_id)",
         "CREATE INDEX IF NOT EXISTS idx_runners_trainer_id ON runners(trainer_id)",
         "CREATE INDEX IF NOT EXISTS idx_runners_jockey_id ON runners(jockey_id)",
@@ -363,6 +365,50 @@ def create_indexes(conn: sqlite3.Connection) -> None:
     logger.info("Indexes created successfully")
 
 
+# Trigram FTS5 indexes behind query_racecards' partial-name lookups. A trigram
+# table answers LIKE '%x%' from its index instead of scanning the source table.
+SEARCH_INDEXES = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS horses_fts USING fts5("
+    "name, content='horses', content_rowid='rowid', tokenize='trigram')",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS trainers_fts USING fts5("
+    "name, content='trainers', content_rowid='rowid', tokenize='trigram')",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS courses_fts USING fts5("
+    "course, tokenize='trigram')",
+]
+
+
+def create_search_indexes(conn: sqlite3.Connection) -> None:
+    """Create and rebuild the FTS5 search indexes
+    
+    Runs in one transaction, so a failed rebuild can't leave an empty index
+    behind. Readers fall back to plain LIKE scans while the indexes are
+    missing or out of step with their source tables.
+    """
+    cursor = conn.cursor()
+    
+    logger.info("Rebuilding search indexes...")
+    
+    try:
+        cursor.execute("BEGIN")
+        for create_sql in SEARCH_INDEXES:
+            cursor.execute(create_sql)
+        
+        # External-content tables are not updated by the inserts above
+        cursor.execute("INSERT INTO horses_fts(horses_fts) VALUES('rebuild')")
+        cursor.execute("INSERT INTO trainers_fts(trainers_fts) VALUES('rebuild')")
+        cursor.execute("DELETE FROM courses_fts")
+        cursor.execute("""
+            INSERT INTO courses_fts(course)
+            SELECT DISTINCT course FROM races WHERE course IS NOT NULL
+        """)
+        conn.commit()
+        logger.info("Search indexes rebuilt successfully")
+    except sqlite3.Error as e:
+        # e.g. SQLite built without FTS5: lookups use full-table LIKE scans
+        conn.rollback()
+        logger.warning(f"Search indexes unavailable: {e}")
+
+
 def optimize_database(conn: sqlite3.Connection) -> None:
     """Optimize database with VACUUM and ANALYZE"""
     logger.info("Optimizing database...")
@@ -863,6 +909,7 @@ def main():
         
         if not missing_dates:
             logger.info("No missing dates to fetch. Database is up to date.")
+            create_search_indexes(conn)
             return
         
         # Fetch data for each missing date
@@ -885,6 +932,7 @@ def main():
         
         # Create indexes after bulk insert
         create_indexes(conn)
+        create_search_indexes(conn)
         
         # Optimize database
         optimize_database(conn)
@@ -694,11 +694,11 @@ class InTheMoneyView(QWidget):
         
         try:
             # Now import with absolute path
-            from ml.predictor import ModelPredictor
+            from ml.predictor import ModelPredictor, PredictorPool
         except ImportError:
             # Fallback to relative import
             try:
-                from ..ml.predictor import ModelPredictor
+                from ..ml.predictor import ModelPredictor, PredictorPool
             except ImportError:
                 QMessageBox.critical(
                     self,
@@ -776,24 +776,24 @@ class InTheMoneyView(QWidget):
                 return []
             
             # Initialize predictor with matching race type
+            # (all types: route each race to its own race-type model)
             racing_db_path = Path(__file__).parent.parent / "racing_pro.db"
-            predictor = ModelPredictor(
-                racing_db_path=str(racing_db_path),
-                race_type=race_type or 'Flat'
-            )
-            
-            # Generate predictions for each race
-            all_predictions = []
-            for race_row in races:
-                race_id = race_row[0]
-                try:
-                    race_predictions = predictor.predict_race(race_id, str(self.upcoming_db_path))
-                    if race_predictions:
-                        all_predictions.append(race_predictions)
-                except Exception as e:
-                    print(f"Error predicting race {race_id}: {e}")
-                    continue
+            if race_type:
+                predictor = ModelPredictor(
+                    racing_db_path=str(racing_db_path),
+                    race_type=race_type
+                )
+            else:
+                predictor = PredictorPool(racing_db_path=str(racing_db_path))
             
+            # Generate predictions for all races in one batched model call
+            race_ids = [race_row[0] for race_row in races]
+            all_predictions = [
+                race_predictions
+                for race_predictions in predictor.predict_races(race_ids, str(self.upcoming_db_path))
+                if race_predictions
+            ]
+
             predictor.close()
             return all_predictions
             
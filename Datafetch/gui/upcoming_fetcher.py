@@ -4,13 +4,22 @@ Creates/recreates upcoming_races.db with fresh data
 """
 
 from PySide6.QtCore import QThread, Signal
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from pathlib import Path
+from typing import Optional
+import os
 import sqlite3
 import requests
+from requests.adapters import HTTPAdapter
+from requests.auth import HTTPBasicAuth
 import time
 
 
+API_URL = "https://api.theracingapi.com/v1/racecards/pro"
+RATE_LIMIT = 0.55  # seconds between request starts
+
+
 class UpcomingRacesFetcher(QThread):
     """Fetch races for yesterday, today, tomorrow into separate database"""
     
@@ -24,6 +33,7 @@ class UpcomingRacesFetcher(QThread):
         super().__init__()
         self.db_path = db_path
         self.conn = None
+        self.session = None
         
     def run(self):
         """Fetch upcoming races"""
@@ -48,23 +58,59 @@ class UpcomingRacesFetcher(QThread):
             self.conn = sqlite3.connect(self.db_path)
             self.create_schema()
             
-            # Fetch each date
+            # One keep-alive session for all dates (single TLS handshake)
+            self.session = self.create_session(pool_size=len(dates))
+            
+            # Requests run on a small pool with starts spaced by the rate
+            # limit, so their network time overlaps; saving stays on this
+            # thread, which owns the SQLite connection
             total_races = 0
-            for i, date in enumerate(dates, 1):
-                self.status.emit(f"Fetching {date}...")
-                self.progress.emit(i, 3)
-                races = self.fetch_date(date)
-                total_races += races
-                time.sleep(0.55)
+            with ThreadPoolExecutor(max_workers=len(dates)) as pool:
+                self.status.emit(f"Fetching {', '.join(dates)}...")
+                futures = []
+                for i, date in enumerate(dates):
+                    if i:
+                        time.sleep(RATE_LIMIT)
+                    futures.append(pool.submit(self.request_date, date))
+                
+                for i, (date, future) in enumerate(zip(dates, futures), 1):
+                    self.status.emit(f"Saving {date}...")
+                    self.progress.emit(i, len(dates))
+                    data = future.result()
+                    if data is not None:
+                        total_races += self.process_and_save(data, date)
             
+            self.session.close()
             self.conn.close()
             self.finished.emit(total_races)
             
         except Exception as e:
+            if self.session:
+                self.session.close()
             if self.conn:
                 self.conn.close()
             self.error.emit(str(e))
     
+    @staticmethod
+    def create_session(pool_size: int = 4) -> requests.Session:
+        """Create an authenticated API session with a pool sized for concurrent dates
+        
+        Credentials come from RACING_API_USER / RACING_API_PASSWORD when both
+        are set, otherwise from the first two lines of reqd_files/cred.txt.
+        """
+        username = os.environ.get("RACING_API_USER")
+        password = os.environ.get("RACING_API_PASSWORD")
+        if not (username and password):
+            cred_file = Path(__file__).parent.parent / "reqd_files" / "cred.txt"
+            lines = cred_file.read_text().splitlines() + ["", ""]
+            username, password = lines[0].strip(), lines[1].strip()
+        
+        session = requests.Session()
+        session.auth = HTTPBasicAuth(username, password)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        session.mount("https://", adapter)
+        return session
+    
     def create_schema(self):
         """Create database tables (same schema as racing_pro.db)"""
         cursor = self.conn.cursor()
@@ -342,30 +388,28 @@ class UpcomingRacesFetcher(QThread):
             WHERE runner_market_odds.runner_id = race_odds.runner_id
         ''', (race_id,))
     
-    def fetch_date(self, date: str) -> int:
-        """Fetch and save races for specific date"""
-        # Load credentials
-        cred_file = Path(__file__).parent.parent / "reqd_files" / "cred.txt"
-        with open(cred_file, "r") as f:
-            username = f.readline().strip()
-            password = f.readline().strip()
-        
-        # Make API request
-        url = "https://api.theracingapi.com/v1/racecards/pro"
-        params = {'date': date}
+    def request_date(self, date: str) -> Optional[dict]:
+        """Request racecards for a date (HTTP only, safe to call from worker threads)"""
+        if self.session is None:
+            self.session = self.create_session()
         
         try:
-            response = requests.get(url, auth=(username, password), params=params, timeout=30)
+            response = self.session.get(API_URL, params={'date': date}, timeout=30)
             
             if response.status_code == 200:
-                data = response.json()
-                return self.process_and_save(data, date)
-            else:
-                return 0
+                return response.json()
+            return None
                 
         except Exception as e:
             print(f"Error fetching {date}: {e}")
+            return None
+    
+    def fetch_date(self, date: str) -> int:
+        """Fetch and save races for specific date"""
+        data = self.request_date(date)
+        if data is None:
             return 0
+        return self.process_and_save(data, date)
     
     def process_and_save(self, data: dict, date: str) -> int:
         """Process API response and save to database"""
@@ -175,102 +175,65 @@ def migrate_runner_odds(conn):
     logger.info("    ✓ Created")
     
     # Step 5: Populate market odds from individual odds
+    # One INSERT ... SELECT: SQLite's aggregates do the per-runner mean,
+    # min, max, count and implied probability, and a window rank picks the
+    # middle value(s) for the median (average of the two middles when even)
     logger.info("  Step 5: Computing market odds aggregates...")
-    
-    import statistics
-    
-    # Get all runners with odds
-    cursor.execute("""
-        SELECT runner_id, GROUP_CONCAT(decimal) as decimals
-        FROM runner_odds
-        WHERE decimal IS NOT NULL
+    cursor.execute('''
+        INSERT OR REPLACE INTO runner_market_odds (
+            runner_id, avg_decimal, median_decimal, min_decimal,
+            max_decimal, bookmaker_count, implied_probability,
+            is_favorite, favorite_rank, updated_at
+        )
+        SELECT runner_id,
+               AVG(decimal),
+               AVG(CASE WHEN rn IN ((cnt + 1) / 2, (cnt + 2) / 2) THEN decimal END),
+               MIN(decimal),
+               MAX(decimal),
+               COUNT(*),
+               CASE WHEN AVG(decimal) > 0 THEN 1.0 / AVG(decimal) END,
+               0, 0, CURRENT_TIMESTAMP
+        FROM (
+            SELECT runner_id, decimal,
+                   ROW_NUMBER() OVER (PARTITION BY runner_id ORDER BY decimal) AS rn,
+                   COUNT(*) OVER (PARTITION BY runner_id) AS cnt
+            FROM runner_odds
+            WHERE decimal IS NOT NULL
+        )
         GROUP BY runner_id
-    """)
-    
-    populated = 0
-    for row in cursor.fetchall():
-        runner_id = row[0]
-        decimals_str = row[1]
-        
-        if not decimals_str:
-            continue
-        
-        try:
-            # Parse decimals
-            decimal_odds = [float(d) for d in decimals_str.split(',') if d]
-            
-            if not decimal_odds:
-                continue
-            
-            # Calculate aggregates
-            avg_decimal = statistics.mean(decimal_odds)
-            median_decimal = statistics.median(decimal_odds)
-            min_decimal = min(decimal_odds)
-            max_decimal = max(decimal_odds)
-            bookmaker_count = len(decimal_odds)
-            implied_prob = 1.0 / avg_decimal if avg_decimal > 0 else None
-            
-            cursor.execute('''
-                INSERT OR REPLACE INTO runner_market_odds (
-                    runner_id, avg_decimal, median_decimal, min_decimal,
-                    max_decimal, bookmaker_count, implied_probability,
-                    is_favorite, favorite_rank, updated_at
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, 0, 0, CURRENT_TIMESTAMP)
-            ''', (runner_id, avg_decimal, median_decimal, min_decimal,
-                  max_decimal, bookmaker_count, implied_prob))
-            
-            populated += 1
-            
-            if populated % 1000 == 0:
-                logger.info(f"    Computed market odds for {populated:,} runners...")
-                conn.commit()
-        
-        except Exception as e:
-            logger.warning(f"    Error computing market odds for runner_id={runner_id}: {e}")
+    ''')
+    populated = cursor.rowcount
     
     conn.commit()
     logger.info(f"    ✓ Computed market odds for {populated:,} runners")
     
     # Step 6: Update favorite status for each race
+    # A single UPDATE ranks every race at once (window partitioned by race)
     logger.info("  Step 6: Computing favorite rankings...")
+    cursor.execute('''
+        WITH race_odds AS (
+            SELECT mo.runner_id,
+                   ROW_NUMBER() OVER (PARTITION BY r.race_id ORDER BY mo.avg_decimal ASC) as rank
+            FROM runner_market_odds mo
+            JOIN runners r ON mo.runner_id = r.runner_id
+            WHERE mo.avg_decimal IS NOT NULL
+        )
+        UPDATE runner_market_odds
+        SET is_favorite = CASE WHEN race_odds.rank = 1 THEN 1 ELSE 0 END,
+            favorite_rank = race_odds.rank
+        FROM race_odds
+        WHERE runner_market_odds.runner_id = race_odds.runner_id
+    ''')
     
-    # Get all races with market odds
     cursor.execute("""
-        SELECT DISTINCT r.race_id
+        SELECT COUNT(DISTINCT r.race_id)
         FROM runner_market_odds mo
         JOIN runners r ON mo.runner_id = r.runner_id
     """)
-    
-    races = [row[0] for row in cursor.fetchall()]
-    logger.info(f"    Found {len(races):,} races with odds data")
-    
-    for i, race_id in enumerate(races):
-        try:
-            # Rank runners by odds (lower = better = favorite)
-            cursor.execute('''
-                WITH race_odds AS (
-                    SELECT mo.runner_id, mo.avg_decimal,
-                           ROW_NUMBER() OVER (ORDER BY mo.avg_decimal ASC) as rank
-                    FROM runner_market_odds mo
-                    JOIN runners r ON mo.runner_id = r.runner_id
-                    WHERE r.race_id = ? AND mo.avg_decimal IS NOT NULL
-                )
-                UPDATE runner_market_odds
-                SET is_favorite = CASE WHEN race_odds.rank = 1 THEN 1 ELSE 0 END,
-                    favorite_rank = race_odds.rank
-                FROM race_odds
-                WHERE runner_market_odds.runner_id = race_odds.runner_id
-            ''', (race_id,))
-            
-            if i % 1000 == 0 and i > 0:
-                logger.info(f"    Processed {i:,}/{len(races):,} races...")
-                conn.commit()
-        
-        except Exception as e:
-            logger.warning(f"    Error computing favorites for race {race_id}: {e}")
+    race_count = cursor.fetchone()[0]
     
     conn.commit()
-    logger.info(f"    ✓ Computed favorites for {len(races):,} races")
+    logger.info(f"    ✓ Computed favorites for {race_count:,} races")
     
     logger.info("✓ Migration complete!")
 
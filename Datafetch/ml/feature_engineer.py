@@ -11,6 +11,7 @@ from pathlib import Path
 from typing import Dict, List, Optional, Tuple
 from datetime import datetime, timedelta
 import numpy as np
+import pandas as pd
 
 from .form_parser import FormParser
 
@@ -42,6 +43,15 @@ def dict_factory(cursor, row):
 class FeatureEngineer:
     """Generate ML features for race runners"""
     
+    # Columns written by compute_relative_features
+    RELATIVE_FEATURE_COLS = (
+        'field_size', 'field_best_rpr', 'field_worst_rpr', 'field_avg_rpr',
+        'field_rpr_spread', 'top_3_rpr_avg', 'pace_pressure_likely',
+        'horse_rpr_rank', 'horse_rpr_vs_best', 'horse_rpr_vs_worst', 'horse_in_top_quartile',
+        'rating_vs_avg', 'weight_lbs_rank', 'weight_vs_avg', 'age_rank', 'age_vs_avg',
+        'tsr_vs_field_avg', 'jockey_rating', 'trainer_rating', 'odds_rank', 'market_rank',
+    )
+    
     def __init__(self, db_path: Path, upcoming_db_path: Path = None):
         self.db_path = db_path
         self.upcoming_db_path = upcoming_db_path
@@ -580,22 +590,30 @@ class FeatureEngineer:
             return int(np.median(style_scores))
         return 3
     
-    def compute_odds_features(self, runner_id: int) -> Dict:
+    def compute_odds_features(self, runner_id: int, market_odds: Optional[Dict] = None) -> Dict:
         """
         Compute 7 standalone odds features
         
         These complement (not replace) RPR/TS features
-        """
-        # Use upcoming_conn if available (for predictions), else use main conn (for training)
-        conn = self.upcoming_conn if self.upcoming_conn else self.conn
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT avg_decimal, median_decimal, min_decimal, max_decimal,
-                   bookmaker_count, implied_probability, is_favorite, favorite_rank
-            FROM runner_market_odds WHERE runner_id = ?
-        ''', (runner_id,))
         
-        row = cursor.fetchone()
+        Args:
+            runner_id: Runner to look up
+            market_odds: Optional runner_market_odds rows already fetched for the
+                race, keyed by runner_id (a missing key means no odds)
+        """
+        if market_odds is not None:
+            row = market_odds.get(runner_id)
+        else:
+            # Use upcoming_conn if available (for predictions), else use main conn (for training)
+            conn = self.upcoming_conn if self.upcoming_conn else self.conn
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT avg_decimal, median_decimal, min_decimal, max_decimal,
+                       bookmaker_count, implied_probability, is_favorite, favorite_rank
+                FROM runner_market_odds WHERE runner_id = ?
+            ''', (runner_id,))
+            
+            row = cursor.fetchone()
         if not row:
             # Use field averages if available (smart defaults)
             field_odds_avg = getattr(self, '_current_field_odds_avg', {'count': 0})
@@ -786,7 +804,8 @@ class FeatureEngineer:
         }
     
     def compute_runner_features(self, runner: Dict, race_context: Dict, 
-                                result: Optional[Dict], field_odds_avg: Dict = None) -> Dict:
+                                result: Optional[Dict], field_odds_avg: Dict = None,
+                                market_odds: Optional[Dict] = None) -> Dict:
         """
         Compute all features for a single runner
         
@@ -795,6 +814,7 @@ class FeatureEngineer:
             race_context: Race context dictionary
             result: Race result (None for upcoming races)
             field_odds_avg: Field-level odds statistics for smart defaults
+            market_odds: Optional prefetched runner_market_odds rows keyed by runner_id
         
         Returns dict with ~50-100 features ready for ML
         """
@@ -864,7 +884,7 @@ class FeatureEngineer:
         features['typical_running_style'] = pace_features.get('typical_running_style', 3)
         
         # === ODDS FEATURES (NEW) ===
-        odds_features = self.compute_odds_features(runner['runner_id'])
+        odds_features = self.compute_odds_features(runner['runner_id'], market_odds)
         features.update(odds_features)
         
         # === DEMOGRAPHIC FEATURES (NEW) ===
@@ -1034,201 +1054,148 @@ class FeatureEngineer:
         min_f, max_f = bands[band_name]
         return min_f <= distance_f <= max_f
     
-    def compute_relative_features(self, all_runner_features: List[Dict]) -> List[Dict]:
+    def compute_relative_features(self, all_runner_features):
         """
         Compute relative features, field strength, and draw bias for all runners
         This is where race-context features come together!
-        Modifies features in place
+        
+        Accepts either a list of feature dicts (modified in place and returned)
+        or a DataFrame with one row per runner (a new DataFrame is returned).
         """
+        if isinstance(all_runner_features, pd.DataFrame):
+            return self._compute_relative_features_frame(all_runner_features)
+        
         if not all_runner_features:
             return all_runner_features
         
-        # === FIELD SIZE ===
-        field_size = len(all_runner_features)
-        for features in all_runner_features:
-            features['field_size'] = field_size
-        
-        # === COLLECT VALUES FOR ANALYSIS ===
-        ratings = []
-        weights = []
-        ages = []
-        tsr_values = []
-        jockey_win_rates = []
-        trainer_win_rates = []
-        running_styles = []
+        # One implementation: run the frame version and copy its outputs back
+        # into each runner's dict (as plain Python scalars, ready for SQLite)
+        frame = self._compute_relative_features_frame(pd.DataFrame(all_runner_features))
+        cols = [col for col in self.RELATIVE_FEATURE_COLS if col in frame.columns]
+        for features, values in zip(all_runner_features, frame[cols].itertuples(index=False)):
+            for col, value in zip(cols, values):
+                if isinstance(value, np.generic):
+                    value = value.item()
+                if value is None or value != value:  # None or NaN
+                    if col not in features:
+                        continue
+                    value = None
+                features[col] = value
         
-        for f in all_runner_features:
-            if f['ofr'] is not None:
-                try:
-                    ratings.append((float(f['ofr']), f))
-                except (ValueError, TypeError):
-                    pass
-            
-            if f['weight_lbs'] is not None:
-                try:
-                    weights.append((float(f['weight_lbs']), f))
-                except (ValueError, TypeError):
-                    pass
-            
-            if f['horse_age'] is not None:
-                try:
-                    ages.append((float(f['horse_age']), f))
-                except (ValueError, TypeError):
-                    pass
-            
-            if f['horse_avg_tsr_last_5'] is not None:
-                try:
-                    tsr_values.append(float(f['horse_avg_tsr_last_5']))
-                except (ValueError, TypeError):
-                    pass
-            
-            # Collect jockey/trainer ratings
-            jockey_wr = f.get('jockey_win_rate_90d', 0) or 0
-            trainer_wr = f.get('trainer_win_rate_90d', 0) or 0
-            jockey_win_rates.append(jockey_wr)
-            trainer_win_rates.append(trainer_wr)
-            
-            # Collect running styles
-            if f['typical_running_style']:
-                running_styles.append(f['typical_running_style'])
+        return all_runner_features
+    
+    def _compute_relative_features_frame(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Relative features for a runner DataFrame (backs compute_relative_features)
+        
+        Rankings use stable sorts so ties break on runner order. Runners without a usable value keep whatever
+        the column already held.
+        """
+        df = df.copy()
+        n = len(df)
+        if n == 0:
+            return df
+        
+        def numeric(col):
+            if col not in df.columns:
+                return np.full(n, np.nan)
+            return pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=np.float64)
+        
+        def stable_ranks(values, mask, descending=False):
+            """1-based ranks of values[mask] (ties keep row order)"""
+            idx = np.flatnonzero(mask)
+            keys = -values[idx] if descending else values[idx]
+            ranks = np.empty(len(idx), dtype=np.int64)
+            ranks[np.argsort(keys, kind='stable')] = np.arange(1, len(idx) + 1)
+            return idx, ranks
+        
+        def set_rows(col, idx, values):
+            if col not in df.columns:
+                df[col] = None
+            df[col] = df[col].astype(object)
+            df.iloc[idx, df.columns.get_loc(col)] = values
+        
+        ofr = numeric('ofr')
+        weight = numeric('weight_lbs')
+        age = numeric('horse_age')
+        tsr = numeric('horse_avg_tsr_last_5')
+        has_ofr, has_weight, has_age, has_tsr = (
+            ~np.isnan(ofr), ~np.isnan(weight), ~np.isnan(age), ~np.isnan(tsr)
+        )
+        jockey_wr = np.nan_to_num(numeric('jockey_win_rate_90d'))
+        trainer_wr = np.nan_to_num(numeric('trainer_win_rate_90d'))
+        
+        # === FIELD SIZE ===
+        df['field_size'] = n
         
         # === FIELD STRENGTH METRICS ===
-        if ratings:
-            rating_values = [r[0] for r in ratings]
-            field_best_rpr = max(rating_values)
-            field_worst_rpr = min(rating_values)
+        if has_ofr.any():
+            rating_values = ofr[has_ofr]
+            field_best_rpr = float(rating_values.max())
+            field_worst_rpr = float(rating_values.min())
             field_avg_rpr = np.mean(rating_values)
             field_rpr_spread = field_best_rpr - field_worst_rpr
             
-            # Top 3 RPR average
-            sorted_ratings = sorted(rating_values, reverse=True)
+            sorted_ratings = np.sort(rating_values)[::-1]
             top_3_rpr_avg = np.mean(sorted_ratings[:3]) if len(sorted_ratings) >= 3 else field_avg_rpr
-            
-            # Top quartile threshold
             top_quartile_threshold = np.percentile(rating_values, 75) if len(rating_values) >= 4 else field_avg_rpr
         else:
-            field_best_rpr = None
-            field_worst_rpr = None
-            field_avg_rpr = None
-            field_rpr_spread = None
-            top_3_rpr_avg = None
-            top_quartile_threshold = None
-        
-        # Average TSR
-        avg_tsr = np.mean(tsr_values) if tsr_values else None
+            field_best_rpr = field_worst_rpr = field_avg_rpr = None
+            field_rpr_spread = top_3_rpr_avg = None
         
-        # Average jockey/trainer ratings
-        avg_jockey_wr = np.mean(jockey_win_rates) if jockey_win_rates else 0
-        avg_trainer_wr = np.mean(trainer_win_rates) if trainer_win_rates else 0
+        avg_tsr = np.mean(tsr[has_tsr]) if has_tsr.any() else None
+        avg_jockey_wr = np.mean(jockey_wr)
+        avg_trainer_wr = np.mean(trainer_wr)
         
         # Pace pressure (count of front-runners/prominent horses)
-        pace_pressure = sum(1 for style in running_styles if style in [1, 2])
+        if 'typical_running_style' in df.columns:
+            pace_pressure = int(df['typical_running_style'].isin([1, 2]).sum())
+        else:
+            pace_pressure = 0
         
         # === POPULATE FIELD STRENGTH FEATURES ===
-        for features in all_runner_features:
-            features['field_best_rpr'] = field_best_rpr
-            features['field_worst_rpr'] = field_worst_rpr
-            features['field_avg_rpr'] = field_avg_rpr
-            features['field_rpr_spread'] = field_rpr_spread
-            features['top_3_rpr_avg'] = top_3_rpr_avg
-            features['pace_pressure_likely'] = pace_pressure
+        df['field_best_rpr'] = field_best_rpr
+        df['field_worst_rpr'] = field_worst_rpr
+        df['field_avg_rpr'] = field_avg_rpr
+        df['field_rpr_spread'] = field_rpr_spread
+        df['top_3_rpr_avg'] = top_3_rpr_avg
+        df['pace_pressure_likely'] = pace_pressure
         
         # === RANKINGS ===
-        # RPR rank
-        if ratings:
-            sorted_ratings = sorted(ratings, key=lambda x: x[0], reverse=True)
-            for rank, (rating_val, f) in enumerate(sorted_ratings, 1):
-                f['horse_rpr_rank'] = rank
-                f['horse_rpr_vs_best'] = rating_val - field_best_rpr
-                f['horse_rpr_vs_worst'] = rating_val - field_worst_rpr
-                f['horse_in_top_quartile'] = 1 if rating_val >= top_quartile_threshold else 0
-        
-        # Weight rank
-        if weights:
-            sorted_weights = sorted(weights, key=lambda x: x[0])  # Lower weight = better rank
-            for rank, (weight_val, f) in enumerate(sorted_weights, 1):
-                f['weight_lbs_rank'] = rank
-        
-        # Age rank
-        if ages:
-            sorted_ages = sorted(ages, key=lambda x: x[0])
-            for rank, (age_val, f) in enumerate(sorted_ages, 1):
-                f['age_rank'] = rank
+        if has_ofr.any():
+            idx, ranks = stable_ranks(ofr, has_ofr, descending=True)
+            set_rows('horse_rpr_rank', idx, ranks)
+            set_rows('horse_rpr_vs_best', idx, ofr[idx] - field_best_rpr)
+            set_rows('horse_rpr_vs_worst', idx, ofr[idx] - field_worst_rpr)
+            set_rows('horse_in_top_quartile', idx, (ofr[idx] >= top_quartile_threshold).astype(np.int64))
+            set_rows('rating_vs_avg', idx, ofr[idx] - field_avg_rpr)
+        
+        if has_weight.any():
+            idx, ranks = stable_ranks(weight, has_weight)  # Lower weight = better rank
+            set_rows('weight_lbs_rank', idx, ranks)
+            set_rows('weight_vs_avg', idx, weight[idx] - np.mean(weight[has_weight]))
+        
+        if has_age.any():
+            idx, ranks = stable_ranks(age, has_age)
+            set_rows('age_rank', idx, ranks)
+            set_rows('age_vs_avg', idx, age[idx] - np.mean(age[has_age]))
         
         # === RELATIVE FEATURES (vs average) ===
-        for features in all_runner_features:
-            # Rating vs avg
-            if features['ofr'] is not None and field_avg_rpr is not None:
-                try:
-                    features['rating_vs_avg'] = float(features['ofr']) - field_avg_rpr
-                except (ValueError, TypeError):
-                    pass
-            
-            # Weight vs avg
-            if weights:
-                avg_weight = np.mean([w[0] for w in weights])
-                if features['weight_lbs'] is not None:
-                    try:
-                        features['weight_vs_avg'] = float(features['weight_lbs']) - avg_weight
-                    except (ValueError, TypeError):
-                        pass
-            
-            # Age vs avg
-            if ages:
-                avg_age = np.mean([a[0] for a in ages])
-                if features['horse_age'] is not None:
-                    try:
-                        features['age_vs_avg'] = float(features['horse_age']) - avg_age
-                    except (ValueError, TypeError):
-                        pass
-            
-            # TSR vs field average
-            if features['horse_avg_tsr_last_5'] is not None and avg_tsr is not None:
-                try:
-                    features['tsr_vs_field_avg'] = float(features['horse_avg_tsr_last_5']) - avg_tsr
-                except (ValueError, TypeError):
-                    pass
-            
-            # Jockey/trainer rating (vs field average)
-            jockey_wr = features.get('jockey_win_rate_90d', 0) or 0
-            trainer_wr = features.get('trainer_win_rate_90d', 0) or 0
-            features['jockey_rating'] = jockey_wr - avg_jockey_wr
-            features['trainer_rating'] = trainer_wr - avg_trainer_wr
+        if avg_tsr is not None:
+            idx = np.flatnonzero(has_tsr)
+            set_rows('tsr_vs_field_avg', idx, tsr[idx] - avg_tsr)
         
-        # === MARKET RANKS (based on OFR as proxy) ===
-        sorted_by_rating = sorted(
-            all_runner_features, 
-            key=lambda x: x['ofr'] if x['ofr'] is not None else -999,
-            reverse=True
-        )
+        df['jockey_rating'] = jockey_wr - avg_jockey_wr
+        df['trainer_rating'] = trainer_wr - avg_trainer_wr
         
-        for rank, features in enumerate(sorted_by_rating, 1):
-            features['odds_rank'] = rank
-            features['market_rank'] = rank
-        
-        # === DRAW BIAS FEATURES ===
-        # Get race context from first runner (all have same race)
-        if all_runner_features:
-            first_runner = all_runner_features[0]
-            race_context = {
-                'course': first_runner.get('race_id', '').split('_')[0] if first_runner.get('race_id') else None,
-                'distance_f': first_runner.get('distance_f'),
-                'race_date': None  # Will be determined from race_id if needed
-            }
-            
-            # Compute draw bias for each runner
-            for features in all_runner_features:
-                # Extract course from race_id if not available
-                # race_id format might be like "rac_12345678" or contain course info
-                # For now, we'll use compute_draw_bias with available data
-                draw = features.get('draw')
-                if draw is not None and features.get('distance_f') is not None:
-                    # Note: course extraction might need adjustment based on your race_id format
-                    # For now, skip draw bias if we can't get course easily
-                    # This will be computed during prediction when we have full race context
-                    pass
+        # === MARKET RANKS (based on OFR as proxy) ===
+        market_order = np.argsort(-np.where(has_ofr, ofr, -999.0), kind='stable')
+        market_rank = np.empty(n, dtype=np.int64)
+        market_rank[market_order] = np.arange(1, n + 1)
+        df['odds_rank'] = market_rank
+        df['market_rank'] = market_rank
         
-        return all_runner_features
+        return df
     
     def compute_target_variables(self, race_id: str, horse_id: str, 
                                 runner_id: int, result: Dict) -> Dict:
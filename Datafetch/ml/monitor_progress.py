@@ -9,91 +9,148 @@ from pathlib import Path
 from datetime import datetime
 
 
-def check_status():
-    """Check current status of ML pipeline"""
-    db_path = Path(__file__).parent.parent / "racing_pro.db"
+_indexes_ensured = False
+
+
+def _ensure_indexes(conn):
+    """Create the partial index used by the active-horse count (once per process)"""
+    global _indexes_ensured
+    if _indexes_ensured:
+        return
     
-    if not db_path.exists():
-        print("❌ Database not found")
+    try:
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_hcs_active "
+            "ON horse_career_stats(horse_id) WHERE total_runs > 0"
+        )
+        conn.commit()
+    except sqlite3.OperationalError:
+        # Stats table not created yet, or DB locked by a running pipeline step
         return
     
-    conn = sqlite3.connect(str(db_path))
+    _indexes_ensured = True
+
+
+def _collect(conn):
+    """Run all status queries and return the raw counts (no output)"""
     cursor = conn.cursor()
-    
-    print("\n" + "="*60)
-    print("ML PIPELINE STATUS")
-    print("="*60 + "\n")
+    data = {}
     
     # Racecard data
-    print("📊 RACECARD DATA (Original)")
     cursor.execute("SELECT COUNT(*) FROM races")
-    race_count = cursor.fetchone()[0]
+    data['race_count'] = cursor.fetchone()[0]
+    
+    # Every other table is populated from racecards, so nothing else to count
+    if data['race_count'] == 0:
+        return data
     
     cursor.execute("SELECT COUNT(*) FROM runners")
-    runner_count = cursor.fetchone()[0]
+    data['runner_count'] = cursor.fetchone()[0]
     
     cursor.execute("SELECT MIN(date), MAX(date) FROM races")
-    date_range = cursor.fetchone()
-    
-    print(f"  Races: {race_count:,}")
-    print(f"  Runners: {runner_count:,}")
-    print(f"  Date range: {date_range[0]} to {date_range[1]}")
+    data['date_range'] = cursor.fetchone()
     
     # Results data
-    print("\n📈 RESULTS DATA (Fetched)")
     cursor.execute("SELECT COUNT(*) FROM results")
-    result_count = cursor.fetchone()[0]
+    data['result_count'] = cursor.fetchone()[0]
+    
+    data['races_with_results'] = 0
+    data['horses_with_results'] = 0
+    data['result_times'] = None
+    # Stats are computed from results, so they are all zero without them
+    stats_counts = {'horse': 0, 'trainer': 0, 'jockey': 0, 'combo': 0}
+    
+    if data['result_count'] > 0:
+        cursor.execute("SELECT COUNT(DISTINCT race_id) FROM results")
+        data['races_with_results'] = cursor.fetchone()[0]
+        
+        cursor.execute("SELECT COUNT(DISTINCT horse_id) FROM results")
+        data['horses_with_results'] = cursor.fetchone()[0]
+        
+        cursor.execute("SELECT MIN(created_at), MAX(created_at) FROM results LIMIT 1")
+        data['result_times'] = cursor.fetchone()
+        
+        # All four stats-table counts in one round-trip, labelled so the rows
+        # can be separated again on the Python side
+        cursor.execute("""
+            SELECT 'horse', COUNT(*) FROM horse_career_stats WHERE total_runs > 0
+            UNION ALL SELECT 'trainer', COUNT(*) FROM trainer_stats
+            UNION ALL SELECT 'jockey', COUNT(*) FROM jockey_stats
+            UNION ALL SELECT 'combo', COUNT(*) FROM trainer_jockey_combos
+        """)
+        stats_counts = dict(cursor.fetchall())
+    
+    data['horse_stats'] = stats_counts['horse']
+    data['trainer_stats'] = stats_counts['trainer']
+    data['jockey_stats'] = stats_counts['jockey']
+    data['combo_stats'] = stats_counts['combo']
+    
+    # ML Features
+    cursor.execute("SELECT COUNT(*) FROM ml_features")
+    data['feature_count'] = cursor.fetchone()[0]
+    
+    data['target_count'] = 0
+    data['races_with_features'] = None
+    if data['feature_count'] > 0:
+        cursor.execute("SELECT COUNT(*) FROM ml_targets")
+        data['target_count'] = cursor.fetchone()[0]
+        
+        cursor.execute("SELECT COUNT(DISTINCT race_id) FROM ml_features")
+        data['races_with_features'] = cursor.fetchone()[0]
+    
+    return data
+
+
+def _render(data):
+    """Print the status report for data returned by _collect()"""
+    print("\n" + "="*60)
+    print("ML PIPELINE STATUS")
+    print("="*60 + "\n")
+    
+    race_count = data['race_count']
+    if race_count == 0:
+        print("📊 No races yet")
+        print("  → Run: python fetch_racecards_pro.py")
+        print("\n" + "="*60 + "\n")
+        return
     
-    cursor.execute("SELECT COUNT(DISTINCT race_id) FROM results")
-    races_with_results = cursor.fetchone()[0]
+    result_count = data['result_count']
+    races_with_results = data['races_with_results']
+    horse_stats = data['horse_stats']
+    feature_count = data['feature_count']
     
-    cursor.execute("SELECT COUNT(DISTINCT horse_id) FROM results")
-    horses_with_results = cursor.fetchone()[0]
+    # Racecard data
+    print("📊 RACECARD DATA (Original)")
+    date_range = data['date_range']
+    print(f"  Races: {race_count:,}")
+    print(f"  Runners: {data['runner_count']:,}")
+    print(f"  Date range: {date_range[0]} to {date_range[1]}")
     
+    # Results data
+    print("\n📈 RESULTS DATA (Fetched)")
     print(f"  Results: {result_count:,}")
     print(f"  Races with results: {races_with_results:,} ({races_with_results/race_count*100:.1f}% of total)")
-    print(f"  Unique horses: {horses_with_results:,}")
+    print(f"  Unique horses: {data['horses_with_results']:,}")
     
-    if result_count > 0:
-        cursor.execute("SELECT MIN(created_at), MAX(created_at) FROM results LIMIT 1")
-        result_times = cursor.fetchone()
+    if data['result_times'] is not None:
+        result_times = data['result_times']
         print(f"  Fetch started: {result_times[0]}")
         print(f"  Last update: {result_times[1]}")
     
     # Statistics
     print("\n📊 COMPUTED STATISTICS")
-    
-    cursor.execute("SELECT COUNT(*) FROM horse_career_stats WHERE total_runs > 0")
-    horse_stats = cursor.fetchone()[0]
     print(f"  Horse career stats: {horse_stats:,}")
-    
-    cursor.execute("SELECT COUNT(*) FROM trainer_stats")
-    trainer_stats = cursor.fetchone()[0]
-    print(f"  Trainer stats: {trainer_stats:,}")
-    
-    cursor.execute("SELECT COUNT(*) FROM jockey_stats")
-    jockey_stats = cursor.fetchone()[0]
-    print(f"  Jockey stats: {jockey_stats:,}")
-    
-    cursor.execute("SELECT COUNT(*) FROM trainer_jockey_combos")
-    combo_stats = cursor.fetchone()[0]
-    print(f"  Trainer-Jockey combos: {combo_stats:,}")
+    print(f"  Trainer stats: {data['trainer_stats']:,}")
+    print(f"  Jockey stats: {data['jockey_stats']:,}")
+    print(f"  Trainer-Jockey combos: {data['combo_stats']:,}")
     
     # ML Features
     print("\n🤖 ML FEATURES")
-    
-    cursor.execute("SELECT COUNT(*) FROM ml_features")
-    feature_count = cursor.fetchone()[0]
     print(f"  Feature vectors: {feature_count:,}")
+    print(f"  Target labels: {data['target_count']:,}")
     
-    cursor.execute("SELECT COUNT(*) FROM ml_targets")
-    target_count = cursor.fetchone()[0]
-    print(f"  Target labels: {target_count:,}")
-    
-    if feature_count > 0:
-        cursor.execute("SELECT COUNT(DISTINCT race_id) FROM ml_features")
-        races_with_features = cursor.fetchone()[0]
-        print(f"  Races with features: {races_with_features:,}")
+    if data['races_with_features'] is not None:
+        print(f"  Races with features: {data['races_with_features']:,}")
     
     # Pipeline Status
     print("\n🔄 PIPELINE STATUS")
@@ -134,8 +191,24 @@ def check_status():
         print("  → Explore data in GUI Data Exploration tab")
     
     print("\n" + "="*60 + "\n")
+
+
+def check_status():
+    """Check current status of ML pipeline"""
+    db_path = Path(__file__).parent.parent / "racing_pro.db"
+    
+    if not db_path.exists():
+        print("❌ Database not found")
+        return
+    
+    conn = sqlite3.connect(str(db_path))
+    _ensure_indexes(conn)
+    try:
+        data = _collect(conn)
+    finally:
+        conn.close()
     
-    conn.close()
+    _render(data)
 
 
 if __name__ == "__main__":
@@ -4,34 +4,171 @@ ML Predictor - Generate predictions for upcoming races
 Uses trained XGBoost model to predict win probabilities
 """
 
+import copy
+import functools
 import json
+import logging
+import os
+import re
 import numpy as np
 import pandas as pd
 from pathlib import Path
 from typing import Dict, List, Tuple, Optional
 import sqlite3
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 
 # Add parent directory to path to import feature_engineer
 sys.path.append(str(Path(__file__).parent.parent))
 
 from ml.feature_engineer import FeatureEngineer
 
+logger = logging.getLogger(__name__)
 
-def dict_factory(cursor, row):
+# Class number in a race_class string (e.g. "Class 3" -> 3)
+_CLASS_RE = re.compile(r'\d+')
+
+# Race class defaults for missing RPR/TS (used when the field has no values)
+_CLASS_DEFAULTS = {
+    'rpr': {
+        'Group 1': 115, 'Group 2': 115, 'Group 3': 110,
+        'Listed': 110,
+        'Class 1': 105, 'Class 2': 100, 'Class 3': 95,
+        'Class 4': 85, 'Class 5': 75, 'Class 6': 65, 'Class 7': 65
+    },
+    'ts': {
+        'Group 1': 90, 'Group 2': 90, 'Group 3': 85,
+        'Listed': 85,
+        'Class 1': 80, 'Class 2': 75, 'Class 3': 70,
+        'Class 4': 65, 'Class 5': 60, 'Class 6': 55, 'Class 7': 55
+    }
+}
+
+# Global defaults when neither the field nor the race class gives a value
+_GLOBAL_DEFAULTS = {'rpr': 90, 'ts': 70}
+
+
+@functools.lru_cache(maxsize=256)
+def _class_default(feature_name: str, race_class: str) -> float:
+    """Race class default for a feature, memoized per race_class string"""
+    defaults = _CLASS_DEFAULTS.get(feature_name, {})
+    
+    if race_class:
+        # Try exact match
+        if race_class in defaults:
+            return defaults[race_class]
+        # Try partial match (e.g., "Class 3" contains "Class 3")
+        for key, value in defaults.items():
+            if key in race_class or race_class in key:
+                return value
+    
+    return _GLOBAL_DEFAULTS.get(feature_name, 70)
+
+
+@functools.lru_cache(maxsize=8)
+def _load_booster(model_path: str, mtime_ns: int):
+    """
+    Load an XGBoost Booster, shared across ModelPredictor instances
+    
+    mtime_ns is part of the cache key so a retrained model file is reloaded.
+    Booster.predict is thread-safe, so sharing one instance is fine.
+    """
+    import xgboost as xgb
+    
+    booster = xgb.Booster()
+    booster.load_model(model_path)
+    return booster
+
+
+@functools.lru_cache(maxsize=8)
+def _load_feature_columns(path: str, mtime_ns: int) -> Tuple[str, ...]:
+    """Load a feature_columns_*.json file (cached; treat the result as read-only)"""
+    with open(path, 'r') as f:
+        return tuple(json.load(f))
+
+
+@functools.lru_cache(maxsize=8)
+def _load_feature_importance(path: str, mtime_ns: int) -> Dict[str, float]:
+    """Load a feature_importance_*.csv file (cached; treat the result as read-only)"""
+    importance_df = pd.read_csv(path)
+    return dict(zip(importance_df['feature'], importance_df['importance']))
+
+
+@functools.lru_cache(maxsize=8)
+def _load_treelite_predictor(model_path: str, mtime_ns: int):
     """
-    Convert sqlite3 query results to dictionaries
+    Compile an XGBoost model to a native shared library with Treelite/TL2cgen
     
-    This allows using .get() method which sqlite3.Row doesn't support.
+    The library is written next to the model and only rebuilt when the model
+    file is newer. Returns None (XGBoost is used instead) if treelite/tl2cgen
+    aren't installed or compilation fails.
     """
-    fields = [column[0] for column in cursor.description]
-    return {key: value for key, value in zip(fields, row)}
+    try:
+        import treelite
+        import tl2cgen
+    except ImportError:
+        logger.warning("treelite/tl2cgen not installed, using XGBoost for inference")
+        return None
+    
+    lib_path = Path(model_path).with_name(Path(model_path).stem + "_treelite.so")
+    try:
+        if not lib_path.exists() or lib_path.stat().st_mtime_ns < mtime_ns:
+            model = treelite.frontend.load_xgboost_model(model_path)
+            toolchain = 'clang' if sys.platform == 'darwin' else 'gcc'
+            # Not quantized: TL2cgen's 'quantize' option moved scores by up to
+            # 0.1 against XGBoost on our models, unquantized matches to ~1e-6
+            tl2cgen.export_lib(
+                model, toolchain=toolchain, libpath=str(lib_path),
+                params={'parallel_comp': os.cpu_count() or 1}
+            )
+        return tl2cgen.Predictor(str(lib_path))
+    except Exception as e:
+        logger.warning("Treelite compilation failed, using XGBoost for inference: %s", e)
+        return None
 
 
 class ModelPredictor:
     """Generate predictions for upcoming races using trained ML model"""
     
-    def __init__(self, model_path: str = None, racing_db_path: str = None, race_type: str = 'Flat'):
+    # Fixed SQL text so sqlite3's statement cache reuses the compiled plans
+    _RACE_SQL = """
+        SELECT race_id, course, date, off_time as time, distance, distance_f, going, 
+               surface, type, race_class, race_name, prize, age_band, pattern, region
+        FROM races
+        WHERE race_id = ?
+    """
+    
+    _RUNNERS_SQL = """
+        SELECT r.runner_id, r.number, r.draw, r.lbs, r.ofr, r.rpr, r.ts,
+               r.headgear, r.form,
+               h.horse_id, h.name as horse_name, h.age,
+               t.trainer_id, t.name as trainer_name,
+               j.jockey_id, j.name as jockey_name,
+               mo.avg_decimal as market_odds,
+               mo.implied_probability as market_prob
+        FROM runners r
+        LEFT JOIN horses h ON r.horse_id = h.horse_id
+        LEFT JOIN trainers t ON r.trainer_id = t.trainer_id
+        LEFT JOIN jockeys j ON r.jockey_id = j.jockey_id
+        LEFT JOIN runner_market_odds mo ON r.runner_id = mo.runner_id
+        WHERE r.race_id = ?
+        ORDER BY r.number
+    """
+    
+    # Runner IDs are bound as one JSON array, so the plan doesn't depend on field size.
+    # Selects every column FeatureEngineer.compute_odds_features reads, so the same
+    # rows serve both the field averages and the per-runner odds features.
+    _FIELD_ODDS_SQL = """
+        SELECT runner_id, avg_decimal, median_decimal, min_decimal, max_decimal,
+               bookmaker_count, implied_probability, is_favorite, favorite_rank
+        FROM runner_market_odds
+        WHERE runner_id IN (SELECT value FROM json_each(?))
+    """
+    
+    def __init__(self, model_path: str = None, racing_db_path: str = None, race_type: str = 'Flat',
+                 use_treelite: bool = False):
         """
         Initialize predictor with trained model
         
@@ -39,6 +176,8 @@ class ModelPredictor:
             model_path: Path to trained model JSON file (optional, auto-generates from race_type if not provided)
             racing_db_path: Path to racing_pro.db with historical data
             race_type: Type of races to predict ('Flat', 'Hurdle', 'Chase')
+            use_treelite: Score with a Treelite-compiled copy of the model (needs
+                treelite + tl2cgen and a C compiler; falls back to XGBoost)
         """
         self.race_type = race_type
         self.model_dir = Path(__file__).parent / "models"
@@ -57,10 +196,15 @@ class ModelPredictor:
             self.racing_db_path = Path(__file__).parent.parent / "racing_pro.db"
         
         self.model = None
+        self.use_treelite = use_treelite
+        self._treelite_predictor = None
         self.feature_columns = None
+        self._feature_columns_set = frozenset()
         self.feature_importance = None
         self.feature_engineer = None
         self._upcoming_db_connected = False
+        self._upcoming_conn = None
+        self._upcoming_conn_path = None
         
         self._load_model()
         self._load_feature_metadata()
@@ -69,8 +213,6 @@ class ModelPredictor:
     def _load_model(self):
         """Load trained XGBoost model"""
         try:
-            import xgboost as xgb
-            
             if not self.model_path.exists():
                 raise FileNotFoundError(
                     f"Model not found: {self.model_path}\n"
@@ -78,8 +220,10 @@ class ModelPredictor:
                     f"python train_baseline.py --race-type {self.race_type}"
                 )
             
-            self.model = xgb.Booster()
-            self.model.load_model(str(self.model_path))
+            model_mtime = self.model_path.stat().st_mtime_ns
+            self.model = _load_booster(str(self.model_path), model_mtime)
+            if self.use_treelite:
+                self._treelite_predictor = _load_treelite_predictor(str(self.model_path), model_mtime)
             print(f"✓ Loaded {self.race_type} racing model from {self.model_path.name}")
         except Exception as e:
             raise RuntimeError(f"Failed to load model: {e}")
@@ -91,8 +235,10 @@ class ModelPredictor:
         # Load race-type-specific feature columns
         feature_cols_path = self.model_dir / f"feature_columns_{race_type_lower}.json"
         if feature_cols_path.exists():
-            with open(feature_cols_path, 'r') as f:
-                self.feature_columns = json.load(f)
+            self.feature_columns = list(_load_feature_columns(
+                str(feature_cols_path), feature_cols_path.stat().st_mtime_ns
+            ))
+            self._feature_columns_set = frozenset(self.feature_columns)
             print(f"✓ Loaded {len(self.feature_columns)} feature columns for {self.race_type} racing")
         else:
             raise FileNotFoundError(
@@ -103,12 +249,22 @@ class ModelPredictor:
         # Load race-type-specific feature importance
         importance_path = self.model_dir / f"feature_importance_{race_type_lower}.csv"
         if importance_path.exists():
-            importance_df = pd.read_csv(importance_path)
-            self.feature_importance = dict(zip(importance_df['feature'], importance_df['importance']))
+            self.feature_importance = _load_feature_importance(
+                str(importance_path), importance_path.stat().st_mtime_ns
+            )
             print(f"✓ Loaded feature importance scores")
         else:
             print("⚠ Feature importance file not found, will use default importance")
             self.feature_importance = {col: 1.0/len(self.feature_columns) for col in self.feature_columns}
+        
+        # Importance aligned with the feature matrix columns, for vectorized contributions.
+        # Features without an importance score are masked out rather than given 0.
+        self._importance_vec = np.array(
+            [self.feature_importance.get(col, 0.0) for col in self.feature_columns], dtype=np.float64
+        )
+        self._has_importance = np.array(
+            [col in self.feature_importance for col in self.feature_columns], dtype=bool
+        )
     
     def _init_feature_engineer(self, upcoming_db_path: str = None):
         """Initialize feature engineer for generating features"""
@@ -118,6 +274,15 @@ class ModelPredictor:
         )
         self.feature_engineer.connect()
     
+    def _ensure_feature_engineer(self, upcoming_db_path: str):
+        """Initialize or update feature engineer with upcoming database connection"""
+        if not self.feature_engineer or not self._upcoming_db_connected:
+            if self.feature_engineer:
+                self.feature_engineer.close()
+            self._init_feature_engineer(upcoming_db_path)
+            self._upcoming_db_connected = True
+            print(f"✓ Feature engineer connected to upcoming database: {upcoming_db_path}")
+    
     def predict_race(self, race_id: str, upcoming_db_path: str) -> Dict:
         """
         Generate predictions for all runners in a race
@@ -129,14 +294,162 @@ class ModelPredictor:
         Returns:
             Dictionary with race info and predictions for each runner
         """
-        # Initialize or update feature engineer with upcoming database connection
-        if not self.feature_engineer or not self._upcoming_db_connected:
-            if self.feature_engineer:
-                self.feature_engineer.close()
-            self._init_feature_engineer(upcoming_db_path)
-            self._upcoming_db_connected = True
-            print(f"✓ Feature engineer connected to upcoming database: {upcoming_db_path}")
+        self._ensure_feature_engineer(upcoming_db_path)
+        
+        # Use today's date to ensure we only use historical data
+        race_date = datetime.now().strftime('%Y-%m-%d')
+        
+        prepared = self._prepare_race(race_id, upcoming_db_path, race_date)
+        if not prepared:
+            return None
+        
+        race_data, runner_info, features_df, X = prepared
+        
+        # Make predictions with RANKING model
+        ranking_scores = self._predict_scores(X)
+        
+        return self._build_race_predictions(race_data, runner_info, X, ranking_scores)
+    
+    def predict_races(self, race_ids: List[str], upcoming_db_path: str) -> List[Optional[Dict]]:
+        """
+        Generate predictions for several races with a single model call
+        
+        Feature matrices for all races are stacked and scored together, then
+        split back per race using the runner counts as group boundaries.
+        Errors are isolated per race: a race that fails to prepare, score or
+        build comes back as None and the rest of the card is unaffected.
+        
+        Args:
+            race_ids: Race IDs from upcoming_races.db
+            upcoming_db_path: Path to upcoming_races.db
+            
+        Returns:
+            List aligned with race_ids; each entry is the predict_race() result,
+            or None if the race was skipped or failed
+        """
+        self._ensure_feature_engineer(upcoming_db_path)
+        
+        # Use today's date to ensure we only use historical data
+        race_date = datetime.now().strftime('%Y-%m-%d')
+        
+        results = [None] * len(race_ids)
+        prepared_races = []
+        for idx, race_id in enumerate(race_ids):
+            try:
+                prepared = self._prepare_race(race_id, upcoming_db_path, race_date)
+            except Exception as e:
+                logger.warning("Error preparing race %s: %s", race_id, e, exc_info=True)
+                continue
+            if prepared:
+                prepared_races.append((idx, prepared))
+        
+        if not prepared_races:
+            return results
+        
+        # One matrix for the whole card; offsets mark where each race starts
+        offsets = np.cumsum([0] + [len(prepared[3]) for _, prepared in prepared_races])
+        try:
+            scores_all = self._predict_scores(
+                np.vstack([prepared[3] for _, prepared in prepared_races])
+            )
+        except Exception as e:
+            # Fall back to scoring race by race, so a bad race only loses itself
+            logger.warning("Batched scoring failed (%s); scoring races one at a time", e)
+            scores_all = None
+        
+        for k, (idx, (race_data, runner_info, _, X)) in enumerate(prepared_races):
+            try:
+                if scores_all is None:
+                    ranking_scores = self._predict_scores(X)
+                else:
+                    ranking_scores = scores_all[offsets[k]:offsets[k + 1]]
+                results[idx] = self._build_race_predictions(
+                    race_data, runner_info, X, ranking_scores
+                )
+            except Exception as e:
+                logger.warning("Error predicting race %s: %s", race_ids[idx], e, exc_info=True)
+        
+        return results
+    
+    def predict_races_parallel(self, race_ids: List[str], upcoming_db_path: str,
+                               max_workers: int = 4) -> List[Optional[Dict]]:
+        """
+        Predict several races concurrently, one predict_race() call per race
+        
+        Each worker thread gets its own copy of this predictor (same Booster and
+        feature metadata, separate SQLite connections), so database reads and
+        model scoring overlap across races. Use this when races shouldn't be
+        stacked into one matrix; otherwise predict_races() is cheaper.
+        
+        Args:
+            race_ids: Race IDs from upcoming_races.db
+            upcoming_db_path: Path to upcoming_races.db
+            max_workers: Number of worker threads
+            
+        Returns:
+            List aligned with race_ids (None for skipped/failed races)
+        """
+        if not race_ids:
+            return []
+        max_workers = max(1, min(max_workers, len(race_ids)))
+        
+        results = [None] * len(race_ids)
+        pending = iter(enumerate(race_ids))
+        pending_lock = threading.Lock()
+        
+        # Split the cores between workers so the booster's own threads don't
+        # oversubscribe. nthread is set on a private copy: the loaded Booster is
+        # cached and shared with every other predictor for this model file.
+        model = self.model.copy()
+        model.set_param({'nthread': max(1, (os.cpu_count() or 1) // max_workers)})
+        
+        def run_worker():
+            # SQLite connections are bound to the thread that opened them, so each
+            # worker owns its predictor copy from first query to close()
+            worker = self._spawn_worker(model)
+            try:
+                while True:
+                    with pending_lock:
+                        item = next(pending, None)
+                    if item is None:
+                        return
+                    idx, race_id = item
+                    try:
+                        results[idx] = worker.predict_race(race_id, upcoming_db_path)
+                    except Exception as e:
+                        logger.warning("Error predicting race %s: %s", race_id, e, exc_info=True)
+            finally:
+                worker.close()
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for future in [executor.submit(run_worker) for _ in range(max_workers)]:
+                future.result()
+        
+        return results
+    
+    def _spawn_worker(self, model=None) -> 'ModelPredictor':
+        """Copy of this predictor sharing the metadata (and the model unless one is
+        given), with no open connections"""
+        worker = copy.copy(self)
+        if model is not None:
+            worker.model = model
+        worker.feature_engineer = None
+        worker._upcoming_db_connected = False
+        worker._upcoming_conn = None
+        worker._upcoming_conn_path = None
+        return worker
+    
+    def _prepare_race(self, race_id: str, upcoming_db_path: str, race_date: str) -> Optional[Tuple]:
+        """
+        Load a race and build its feature matrix
         
+        Args:
+            race_date: Cut-off date for historical stats (YYYY-MM-DD)
+        
+        Returns:
+            (race_data, runner_info, features_df, X) or None if the race
+            can't be predicted by this model
+        """
         # Get race details and runners from upcoming_races.db
         race_data = self._get_race_data(race_id, upcoming_db_path)
         if not race_data:
@@ -145,86 +458,117 @@ class ModelPredictor:
         # Validate race type matches model
         race_type = race_data['race_info'].get('type', 'Unknown')
         if race_type != self.race_type:
-            print(f"⚠️  Skipping {race_type} race (model trained for {self.race_type} only)")
+            logger.debug("Skipping %s race (model trained for %s only)", race_type, self.race_type)
             return None
         
-        print(f"\n🏇 Processing race: {race_data['race_info'].get('course')} {race_data['race_info'].get('time')}")
-        print(f"   Total runners in race: {len(race_data['runners'])}")
-        
-        # PASS 1: Collect available RPR/TS values to calculate field statistics
-        available_rprs = []
-        available_tss = []
+        n_runners = len(race_data['runners'])
+        logger.debug("Processing race: %s %s (%d runners)",
+                     race_data['race_info'].get('course'), race_data['race_info'].get('time'), n_runners)
         
-        for runner in race_data['runners']:
-            rpr = self._safe_convert(runner.get('rpr'))
-            ts = self._safe_convert(runner.get('ts'))
-            
-            if rpr is not None:
-                available_rprs.append(rpr)
-            if ts is not None:
-                available_tss.append(ts)
+        # Convert runner numerics for the whole field in one pass ('-' -> NaN)
+        runners_df = pd.DataFrame(race_data['runners'], columns=race_data['runner_columns'])
+        runners_df = runners_df[['rpr', 'ts', 'lbs', 'ofr']]
+        numeric = runners_df.apply(pd.to_numeric, errors='coerce')
         
-        # Calculate field statistics for smart defaults
+        # PASS 1: Field statistics for smart defaults, reduced straight off the numeric columns
+        rpr_series = numeric['rpr']
+        ts_series = numeric['ts']
+        count_rpr = int(rpr_series.notna().sum())
+        count_ts = int(ts_series.notna().sum())
         field_stats = {
-            'median_rpr': np.median(available_rprs) if len(available_rprs) >= 3 else None,
-            'avg_rpr': np.mean(available_rprs) if len(available_rprs) >= 1 else None,
-            'median_ts': np.median(available_tss) if len(available_tss) >= 3 else None,
-            'avg_ts': np.mean(available_tss) if len(available_tss) >= 1 else None,
-            'count_rpr': len(available_rprs),
-            'count_ts': len(available_tss)
+            'median_rpr': float(rpr_series.median()) if count_rpr >= 3 else None,
+            'avg_rpr': float(rpr_series.mean()) if count_rpr >= 1 else None,
+            'median_ts': float(ts_series.median()) if count_ts >= 3 else None,
+            'avg_ts': float(ts_series.mean()) if count_ts >= 1 else None,
+            'count_rpr': count_rpr,
+            'count_ts': count_ts
         }
         
-        print(f"   Runners with RPR: {field_stats['count_rpr']}/{len(race_data['runners'])}")
-        print(f"   Runners with TS: {field_stats['count_ts']}/{len(race_data['runners'])}")
-        if field_stats['median_rpr']:
-            print(f"   Field median RPR: {field_stats['median_rpr']:.1f}")
+        logger.debug("  Runners with RPR: %d/%d, with TS: %d/%d, field median RPR: %s",
+                     field_stats['count_rpr'], n_runners, field_stats['count_ts'], n_runners,
+                     field_stats['median_rpr'])
         
         # Compute field-level odds statistics for smart defaults
-        field_odds_avg = self._compute_field_odds_stats(race_data['runners'])
-        if field_odds_avg['count'] > 0:
-            print(f"   Runners with odds: {field_odds_avg['count']}/{len(race_data['runners'])}")
+        field_odds_avg, market_odds = self._compute_field_odds_stats(race_data['runners'])
+        logger.debug("  Runners with odds: %d/%d", field_odds_avg['count'], n_runners)
         
         # PASS 2: Generate features for each runner (with smart defaults)
+        # Race-level encodings are identical for every runner, so build them once
+        race_context = self._build_race_context(race_data['race_info'], race_date)
+        
+        # Fill missing RPR/TS with smart defaults (field stats and class are per race)
+        race_class_str = race_data['race_info'].get('race_class')
+        rpr_missing = numeric['rpr'].isna().to_numpy()
+        ts_missing = numeric['ts'].isna().to_numpy()
+        if rpr_missing.any():
+            numeric['rpr'] = numeric['rpr'].fillna(self._get_smart_default(field_stats, race_class_str, 'rpr'))
+        if ts_missing.any():
+            numeric['ts'] = numeric['ts'].fillna(self._get_smart_default(field_stats, race_class_str, 'ts'))
+        
+        numeric = numeric.astype(object).where(numeric.notna(), None)
+        
         features_list = []
         runner_info = []
         
-        for runner in race_data['runners']:
+        for i, (runner, values) in enumerate(zip(race_data['runners'], numeric.itertuples(index=False))):
             # Generate features using FeatureEngineer (now with field stats and odds stats)
             features = self._generate_runner_features(
-                race_data['race_info'],
+                race_context,
                 runner,
-                field_stats,
-                field_odds_avg
+                values,
+                rpr_missing[i],
+                ts_missing[i],
+                field_odds_avg,
+                market_odds
             )
             
             if features:
                 features_list.append(features)
                 runner_info.append(runner)
         
-        print(f"   Successfully generated features for: {len(features_list)}/{len(race_data['runners'])} runners")
+        logger.debug("  Generated features for %d/%d runners", len(features_list), n_runners)
         
-        # Diagnostic: Check odds feature population
-        odds_count = sum(1 for f in features_list if f.get('odds_decimal') is not None and f.get('odds_decimal') > 0)
-        if odds_count > 0:
-            print(f"   ✓ Odds features populated: {odds_count}/{len(features_list)} runners ({odds_count*100/len(features_list):.1f}%)")
-        else:
-            print(f"   ⚠️  No odds data available for this race (using defaults)")
+        # Diagnostic: Check odds feature population (only computed when it will be shown)
+        if logger.isEnabledFor(logging.DEBUG):
+            odds_count = sum(1 for f in features_list if f.get('odds_decimal') is not None and f.get('odds_decimal') > 0)
+            logger.debug("  Odds features populated: %d/%d runners", odds_count, len(features_list))
         
         if not features_list:
-            print(f"   ❌ No features generated for any runner!")
+            logger.warning("No features generated for any runner in race %s", race_id)
             return None
         
-        # Compute relative features (field size, rating_vs_avg, etc.)
-        features_list = self.feature_engineer.compute_relative_features(features_list)
+        # Compute relative features (field size, rating_vs_avg, etc.) column-wise
+        features_df = self.feature_engineer.compute_relative_features(pd.DataFrame(features_list))
+        
+        if logger.isEnabledFor(logging.DEBUG):
+            missing = self._feature_columns_set.difference(features_df.columns)
+            if missing:
+                logger.debug("  %d model features not generated (filled with 0): %s",
+                             len(missing), sorted(missing))
         
         # Create feature matrix
-        X = self._prepare_feature_matrix(features_list)
+        X = self._prepare_feature_matrix(features_df)
+        
+        return race_data, runner_info, features_df, X
+    
+    def _predict_scores(self, X: np.ndarray) -> np.ndarray:
+        """Score a feature matrix with the ranking model (higher = better)"""
+        if self._treelite_predictor is not None:
+            import tl2cgen
+            return self._treelite_predictor.predict(tl2cgen.DMatrix(X)).ravel()
+        
+        # Fast path: score the float32 array directly, no DMatrix allocation/copy.
+        # Columns are already in feature_columns order (see _prepare_feature_matrix).
+        if hasattr(self.model, 'inplace_predict'):
+            return self.model.inplace_predict(np.ascontiguousarray(X, dtype=np.float32))
         
-        # Make predictions with RANKING model
         import xgboost as xgb
         dmatrix = xgb.DMatrix(X, feature_names=self.feature_columns)
-        ranking_scores = self.model.predict(dmatrix)
-        
+        return self.model.predict(dmatrix)
+    
+    def _build_race_predictions(self, race_data: Dict, runner_info: List[Dict],
+                                X: np.ndarray, ranking_scores: np.ndarray) -> Dict:
+        """Turn one race's ranking scores into the per-runner prediction dicts"""
         # Convert ranking scores to probabilities using softmax
         # Ranking model outputs relative scores (higher = better)
         # Softmax naturally ensures probabilities sum to 1.0
@@ -235,27 +579,24 @@ class ModelPredictor:
         confidence = self._calculate_confidence(probabilities)
         
         # Get top contributing features for each runner
-        contributions = [
-            self._get_feature_contributions(features_list[i], probabilities[i])
-            for i in range(len(runner_info))
-        ]
+        contributions = self._get_feature_contributions(X)
         
         # Compile results
         predictions = []
         for i, runner in enumerate(runner_info):
             predictions.append({
-                'runner_number': runner.get('number'),
-                'horse_name': runner.get('horse_name'),
-                'trainer': runner.get('trainer_name'),
-                'jockey': runner.get('jockey_name'),
+                'runner_number': runner['number'],
+                'horse_name': runner['horse_name'],
+                'trainer': runner['trainer_name'],
+                'jockey': runner['jockey_name'],
                 'win_probability': float(probabilities[i]),
                 'predicted_rank': int(ranks[i]),
                 'confidence': confidence,
                 'top_features': contributions[i],
-                'value_indicator': self._check_value_bet(probabilities[i], runner.get('ofr')),
-                'market_odds': runner.get('market_odds'),  # Market win odds
-                'market_prob': runner.get('market_prob'),  # Market implied probability
-                'runner_id': runner.get('runner_id')  # For fetching additional data later
+                'value_indicator': self._check_value_bet(probabilities[i], runner['ofr']),
+                'market_odds': runner['market_odds'],  # Market win odds
+                'market_prob': runner['market_prob'],  # Market implied probability
+                'runner_id': runner['runner_id']  # For fetching additional data later
             })
         
         return {
@@ -263,23 +604,24 @@ class ModelPredictor:
             'predictions': sorted(predictions, key=lambda x: x['predicted_rank'])
         }
     
+    def _get_upcoming_conn(self, upcoming_db_path: str) -> sqlite3.Connection:
+        """Return the cached connection to upcoming_races.db, reconnecting if the path changed"""
+        if self._upcoming_conn is None or self._upcoming_conn_path != str(upcoming_db_path):
+            if self._upcoming_conn is not None:
+                self._upcoming_conn.close()
+            self._upcoming_conn = sqlite3.connect(str(upcoming_db_path))
+            # sqlite3.Row gives name-based access without building a dict per row
+            self._upcoming_conn.row_factory = sqlite3.Row
+            self._upcoming_conn_path = str(upcoming_db_path)
+        return self._upcoming_conn
+    
     def _get_race_data(self, race_id: str, upcoming_db_path: str) -> Optional[Dict]:
         """Fetch race and runner data from upcoming_races.db"""
-        conn = sqlite3.connect(upcoming_db_path)
-        conn.row_factory = dict_factory  # Changed from sqlite3.Row to support .get()
-        cursor = conn.cursor()
+        conn = self._get_upcoming_conn(upcoming_db_path)
         
         # Get race info
-        cursor.execute("""
-            SELECT race_id, course, date, off_time as time, distance, distance_f, going, 
-                   surface, type, race_class, race_name, prize, age_band, pattern, region
-            FROM races
-            WHERE race_id = ?
-        """, (race_id,))
-        
-        race_row = cursor.fetchone()
+        race_row = conn.execute(self._RACE_SQL, (race_id,)).fetchone()
         if not race_row:
-            conn.close()
             return None
         
         race_info = dict(race_row)
@@ -291,33 +633,17 @@ class ModelPredictor:
             except (ValueError, TypeError):
                 race_info['distance_f'] = None
         
-        # Get runners with market odds
-        cursor.execute("""
-            SELECT r.runner_id, r.number, r.draw, r.lbs, r.ofr, r.rpr, r.ts,
-                   r.headgear, r.form,
-                   h.horse_id, h.name as horse_name, h.age,
-                   t.trainer_id, t.name as trainer_name,
-                   j.jockey_id, j.name as jockey_name,
-                   mo.avg_decimal as market_odds,
-                   mo.implied_probability as market_prob
-            FROM runners r
-            LEFT JOIN horses h ON r.horse_id = h.horse_id
-            LEFT JOIN trainers t ON r.trainer_id = t.trainer_id
-            LEFT JOIN jockeys j ON r.jockey_id = j.jockey_id
-            LEFT JOIN runner_market_odds mo ON r.runner_id = mo.runner_id
-            WHERE r.race_id = ?
-            ORDER BY r.number
-        """, (race_id,))
-        
-        runners = [dict(row) for row in cursor.fetchall()]
-        conn.close()
+        # Get runners with market odds (sqlite3.Row; all accessed columns are selected)
+        cursor = conn.execute(self._RUNNERS_SQL, (race_id,))
+        runners = cursor.fetchall()
         
         return {
             'race_info': race_info,
-            'runners': runners
+            'runners': runners,
+            'runner_columns': [column[0] for column in cursor.description]
         }
     
-    def _compute_field_odds_stats(self, runners: List[Dict]) -> Dict:
+    def _compute_field_odds_stats(self, runners: List[sqlite3.Row]) -> Tuple[Dict, Optional[Dict]]:
         """
         Compute field-level odds statistics for smart defaults
         
@@ -325,57 +651,50 @@ class ModelPredictor:
         This is better than defaulting to 0 which breaks the model
         
         Args:
-            runners: List of runner dictionaries with runner_id
+            runners: Runner rows (sqlite3.Row) with runner_id
             
         Returns:
-            Dictionary with average odds statistics
+            (field averages dict, per-runner odds rows keyed by runner_id).
+            The per-runner dict is None when odds couldn't be queried.
         """
         if not self.feature_engineer or not self.feature_engineer.upcoming_conn:
-            return {'count': 0}
+            return {'count': 0}, None
         
         # Query all odds for this race's runners
-        runner_ids = [r['runner_id'] for r in runners if r.get('runner_id')]
+        runner_ids = [r['runner_id'] for r in runners if r['runner_id']]
         if not runner_ids:
-            return {'count': 0}
+            return {'count': 0}, {}
         
-        placeholders = ','.join('?' * len(runner_ids))
         conn = self.feature_engineer.upcoming_conn
-        cursor = conn.cursor()
-        
-        cursor.execute(f'''
-            SELECT avg_decimal, implied_probability, favorite_rank, bookmaker_count
-            FROM runner_market_odds
-            WHERE runner_id IN ({placeholders})
-        ''', runner_ids)
-        
-        rows = cursor.fetchall()
+        rows = conn.execute(self._FIELD_ODDS_SQL, (json.dumps(runner_ids),)).fetchall()
+        market_odds = {row['runner_id']: row for row in rows}
         
         if not rows:
-            return {'count': 0}
+            return {'count': 0}, market_odds
         
-        # Compute averages
-        decimals = [r['avg_decimal'] for r in rows if r.get('avg_decimal')]
-        probs = [r['implied_probability'] for r in rows if r.get('implied_probability')]
-        ranks = [r['favorite_rank'] for r in rows if r.get('favorite_rank')]
-        bk_counts = [r['bookmaker_count'] for r in rows if r.get('bookmaker_count')]
+        # columns: decimal, implied prob, favourite rank, bookmaker count (None -> NaN)
+        values = np.array(
+            [(r['avg_decimal'], r['implied_probability'], r['favorite_rank'], r['bookmaker_count'])
+             for r in rows],
+            dtype=np.float64
+        )
+        # Zero means "not set" for all of these, so leave it out of the averages
+        values[values == 0] = np.nan
         
-        return {
+        counts = np.count_nonzero(~np.isnan(values), axis=0)
+        sums = np.nansum(values, axis=0)
+        means = [float(sums[k] / counts[k]) if counts[k] else None for k in range(values.shape[1])]
+        avg_decimal, avg_prob, avg_rank, avg_bk_count = means
+        
+        field_odds_avg = {
             'count': len(rows),
-            'avg_decimal': np.mean(decimals) if decimals else None,
-            'avg_implied_prob': np.mean(probs) if probs else None,
-            'avg_rank': np.mean(ranks) if ranks else 8,  # Default to middle rank
-            'avg_bookmaker_count': int(np.mean(bk_counts)) if bk_counts else 0,
+            'avg_decimal': avg_decimal,
+            'avg_implied_prob': avg_prob,
+            'avg_rank': avg_rank or 8,  # Default to middle rank
+            'avg_bookmaker_count': int(avg_bk_count or 0),
             'avg_spread': 2.0  # Reasonable default spread
         }
-    
-    def _safe_convert(self, value) -> Optional[float]:
-        """Convert value to float, return None for '-' or invalid values"""
-        if value is None or value == '-' or value == '':
-            return None
-        try:
-            return float(value)
-        except (ValueError, TypeError):
-            return None
+        return field_odds_avg, market_odds
     
     def _get_smart_default(self, field_stats: Dict, race_class: str, feature_name: str) -> float:
         """
@@ -407,185 +726,139 @@ class ModelPredictor:
             if field_stats.get('avg_ts') is not None and field_stats.get('count_ts', 0) >= 1:
                 return field_stats['avg_ts']
         
-        # Priority 2: Race class defaults
-        class_defaults = {
-            'rpr': {
-                'Group 1': 115, 'Group 2': 115, 'Group 3': 110,
-                'Listed': 110,
-                'Class 1': 105, 'Class 2': 100, 'Class 3': 95,
-                'Class 4': 85, 'Class 5': 75, 'Class 6': 65, 'Class 7': 65
-            },
-            'ts': {
-                'Group 1': 90, 'Group 2': 90, 'Group 3': 85,
-                'Listed': 85,
-                'Class 1': 80, 'Class 2': 75, 'Class 3': 70,
-                'Class 4': 65, 'Class 5': 60, 'Class 6': 55, 'Class 7': 55
-            }
+        # Priority 2: Race class defaults, Priority 3: Global defaults
+        return _class_default(feature_name, race_class)
+    
+    def _build_race_context(self, race_info: Dict, race_date: str) -> Dict:
+        """Build the FeatureEngineer race context (encoded going/surface/class/prize) for a race"""
+        # Encode categorical features (matching FeatureEngineer logic)
+        going_map = {
+            'heavy': 1, 'soft': 2, 'good to soft': 3, 'good': 4, 
+            'good to firm': 5, 'firm': 6, 'hard': 7, 'standard': 4, 'slow': 3
         }
+        surface_map = {'turf': 1, 'aw': 2, 'tapeta': 2, 'polytrack': 2, 'dirt': 3}
         
-        if race_class:
-            # Try exact match
-            if race_class in class_defaults.get(feature_name, {}):
-                return class_defaults[feature_name][race_class]
-            # Try partial match (e.g., "Class 3" contains "Class 3")
-            for key in class_defaults.get(feature_name, {}).keys():
-                if key in race_class or race_class in key:
-                    return class_defaults[feature_name][key]
+        going_str = str(race_info.get('going') or 'good').lower()
+        going_encoded = going_map.get(going_str, 4)
         
-        # Priority 3: Global defaults
-        return 90 if feature_name == 'rpr' else 70
-    
-    def _generate_runner_features(self, race_info: Dict, runner: Dict, field_stats: Dict = None, field_odds_avg: Dict = None) -> Optional[Dict]:
-        """Generate ML features for a runner using FeatureEngineer"""
-        from datetime import datetime
+        surface_str = str(race_info.get('surface') or 'turf').lower()
+        surface_encoded = surface_map.get(surface_str, 1)
         
-        # Debug logging
-        runner_num = runner.get('number', '?')
-        horse_name = runner.get('horse_name', 'Unknown')
-        rpr_raw = runner.get('rpr')
-        ts_raw = runner.get('ts')
+        # Extract class number from race_class string (e.g., "Class 3" -> 3)
+        race_class_num = None
+        if race_info.get('race_class'):
+            match = _CLASS_RE.search(str(race_info['race_class']))
+            if match:
+                race_class_num = int(match.group())
         
-        print(f"     Runner {runner_num}: {horse_name}")
-        print(f"       Raw RPR: {rpr_raw}, Raw TS: {ts_raw}")
+        # Parse prize money
+        prize_money = 0.0
+        if race_info.get('prize'):
+            try:
+                prize_str = str(race_info['prize']).replace('£', '').replace('€', '').replace(',', '').strip()
+                prize_money = float(prize_str)
+            except:
+                pass
+        
+        # Convert distance_f to float (defensive check)
+        distance_f_val = race_info.get('distance_f')
+        if distance_f_val is not None:
+            try:
+                distance_f_val = float(distance_f_val)
+            except (ValueError, TypeError):
+                distance_f_val = None
         
-        # Use today's date to ensure we only use historical data
-        race_date = datetime.now().strftime('%Y-%m-%d')
-        race_id = race_info['race_id']
+        return {
+            'race_id': race_info['race_id'],
+            'course': race_info.get('course'),
+            'distance_f': distance_f_val,
+            'going': race_info.get('going'),
+            'going_encoded': going_encoded,
+            'surface': race_info.get('surface'),
+            'surface_encoded': surface_encoded,
+            'race_type': race_info.get('type'),
+            'race_class': race_info.get('race_class'),
+            'race_class_encoded': race_class_num,
+            'prize': race_info.get('prize'),
+            'prize_money': prize_money,
+            'age_band': race_info.get('age_band'),
+            'pattern': race_info.get('pattern'),
+            'date': race_date,
+            'region': race_info.get('region')
+        }
+    
+    def _generate_runner_features(self, race_context: Dict, runner: Dict, values, rpr_defaulted: bool = False,
+                                  ts_defaulted: bool = False, field_odds_avg: Dict = None,
+                                  market_odds: Optional[Dict] = None) -> Optional[Dict]:
+        """
+        Generate ML features for a runner using FeatureEngineer
         
-        # Initialize field_stats and field_odds_avg if not provided
-        if field_stats is None:
-            field_stats = {}
+        Args:
+            race_context: Race context from _build_race_context()
+            runner: Runner row from upcoming_races.db
+            values: Converted (rpr, ts, lbs, ofr) for the runner, smart defaults already applied
+            rpr_defaulted / ts_defaulted: Whether RPR/TS came from smart defaults
+            field_odds_avg: Field-level odds statistics for smart defaults
+            market_odds: Prefetched runner_market_odds rows keyed by runner_id
+        """
+        # Initialize field_odds_avg if not provided
         if field_odds_avg is None:
             field_odds_avg = {'count': 0}
         
         try:
-            # Encode categorical features (matching FeatureEngineer logic)
-            going_map = {
-                'heavy': 1, 'soft': 2, 'good to soft': 3, 'good': 4, 
-                'good to firm': 5, 'firm': 6, 'hard': 7, 'standard': 4, 'slow': 3
-            }
-            surface_map = {'turf': 1, 'aw': 2, 'tapeta': 2, 'polytrack': 2, 'dirt': 3}
-            
-            going_str = str(race_info.get('going') or 'good').lower()
-            going_encoded = going_map.get(going_str, 4)
-            
-            surface_str = str(race_info.get('surface') or 'turf').lower()
-            surface_encoded = surface_map.get(surface_str, 1)
+            rpr, ts, lbs, ofr = values
             
-            # Extract class number from race_class string (e.g., "Class 3" -> 3)
-            race_class_num = None
-            if race_info.get('race_class'):
-                import re
-                match = re.search(r'\d+', str(race_info['race_class']))
-                if match:
-                    race_class_num = int(match.group())
-            
-            # Parse prize money
-            prize_money = 0.0
-            if race_info.get('prize'):
-                try:
-                    prize_str = str(race_info['prize']).replace('£', '').replace('€', '').replace(',', '').strip()
-                    prize_money = float(prize_str)
-                except:
-                    pass
-            
-            # Convert distance_f to float (defensive check)
-            distance_f_val = race_info.get('distance_f')
-            if distance_f_val is not None:
-                try:
-                    distance_f_val = float(distance_f_val)
-                except (ValueError, TypeError):
-                    distance_f_val = None
-            
-            # Build race context
-            race_context = {
-                'race_id': race_id,
-                'course': race_info.get('course'),
-                'distance_f': distance_f_val,
-                'going': race_info.get('going'),
-                'going_encoded': going_encoded,
-                'surface': race_info.get('surface'),
-                'surface_encoded': surface_encoded,
-                'race_type': race_info.get('type'),
-                'race_class': race_info.get('race_class'),
-                'race_class_encoded': race_class_num,
-                'prize': race_info.get('prize'),
-                'prize_money': prize_money,
-                'age_band': race_info.get('age_band'),
-                'pattern': race_info.get('pattern'),
-                'date': race_date,
-                'region': race_info.get('region')
-            }
+            # Lazy %-formatting: nothing is built unless DEBUG is enabled
+            logger.debug("    Runner %s: %s (raw RPR %s, TS %s -> final RPR %s%s, TS %s%s)",
+                         runner['number'], runner['horse_name'],
+                         runner['rpr'], runner['ts'],
+                         rpr, ' [default]' if rpr_defaulted else '',
+                         ts, ' [default]' if ts_defaulted else '')
             
             # Build runner dict compatible with FeatureEngineer
-            # Convert numeric fields to proper types (handle '-' placeholders)
-            # Apply SMART DEFAULTS for missing RPR/TS
-            
-            rpr = self._safe_convert(runner.get('rpr'))
-            ts = self._safe_convert(runner.get('ts'))
-            
-            # Apply smart defaults if RPR/TS is missing
-            race_class_str = race_info.get('race_class')
-            
-            if rpr is None:
-                rpr = self._get_smart_default(field_stats, race_class_str, 'rpr')
-                print(f"       ⚠️  Missing RPR - using smart default: {rpr:.1f}")
-            
-            if ts is None:
-                ts = self._get_smart_default(field_stats, race_class_str, 'ts')
-                print(f"       ⚠️  Missing TS - using smart default: {ts:.1f}")
-            
-            print(f"       Final RPR: {rpr:.1f}, Final TS: {ts:.1f}")
-            
             runner_data = {
-                'runner_id': runner.get('runner_id', 0),
-                'horse_id': runner.get('horse_id'),
-                'trainer_id': runner.get('trainer_id'),
-                'jockey_id': runner.get('jockey_id'),
-                'number': runner.get('number'),
-                'draw': runner.get('draw'),
-                'age': runner.get('age'),
-                'lbs': self._safe_convert(runner.get('lbs')),
-                'weight_lbs_combined': self._safe_convert(runner.get('lbs')),  # FeatureEngineer looks for this key
-                'ofr': self._safe_convert(runner.get('ofr')),
+                'runner_id': runner['runner_id'],
+                'horse_id': runner['horse_id'],
+                'trainer_id': runner['trainer_id'],
+                'jockey_id': runner['jockey_id'],
+                'number': runner['number'],
+                'draw': runner['draw'],
+                'age': runner['age'],
+                'lbs': lbs,
+                'weight_lbs_combined': lbs,  # FeatureEngineer looks for this key
+                'ofr': ofr,
                 'rpr': rpr,  # Now with smart defaults
                 'ts': ts,    # Now with smart defaults
-                'headgear': runner.get('headgear'),
-                'form': runner.get('form')
+                'headgear': runner['headgear'],
+                'form': runner['form']
             }
             
             # Generate features (this will compute all ML features)
             # result is None for upcoming races (no historical result yet)
             features = self.feature_engineer.compute_runner_features(
-                runner_data, race_context, result=None, field_odds_avg=field_odds_avg
+                runner_data, race_context, result=None, field_odds_avg=field_odds_avg,
+                market_odds=market_odds
             )
             
             return features
             
         except Exception as e:
-            import traceback
-            print(f"Error generating features for runner {runner.get('horse_name')}: {e}")
-            print(f"Runner data: ofr={runner.get('ofr')}, rpr={runner.get('rpr')}, ts={runner.get('ts')}, lbs={runner.get('lbs')}")
-            print(f"Traceback: {traceback.format_exc()}")
+            # exc_info defers traceback formatting to the logging handler
+            logger.warning(
+                "Error generating features for runner %s: %s (ofr=%s, rpr=%s, ts=%s, lbs=%s)",
+                runner['horse_name'], e, runner['ofr'], runner['rpr'], runner['ts'], runner['lbs'],
+                exc_info=True
+            )
             return None
     
-    def _prepare_feature_matrix(self, features_list: List[Dict]) -> np.ndarray:
-        """Convert feature dictionaries to numpy array matching model's expected features"""
-        X = np.zeros((len(features_list), len(self.feature_columns)))
-        
-        for i, features in enumerate(features_list):
-            for j, col in enumerate(self.feature_columns):
-                value = features.get(col, 0)
-                # Handle None values
-                if value is None:
-                    value = 0
-                # Convert to float
-                try:
-                    X[i, j] = float(value)
-                except (ValueError, TypeError):
-                    X[i, j] = 0
-        
-        return X
+    def _prepare_feature_matrix(self, features_df: pd.DataFrame) -> np.ndarray:
+        """Align the runner feature DataFrame to the model's expected feature columns"""
+        # Missing columns become NaN; '-' placeholders and other strings are coerced to NaN
+        df = features_df.reindex(columns=self.feature_columns)
+        df = df.apply(pd.to_numeric, errors='coerce')
+        
+        # float32 is XGBoost's native dtype, so the DMatrix doesn't need to copy
+        return df.fillna(0.0).to_numpy(dtype=np.float32)
     
     def _scores_to_probabilities(self, scores: np.ndarray) -> np.ndarray:
         """
@@ -604,17 +877,22 @@ class ModelPredictor:
             Probabilities that sum to 1.0
         """
         # Softmax: exp(score) / sum(exp(scores))
-        # Subtract max for numerical stability (prevents overflow)
-        exp_scores = np.exp(scores - np.max(scores))
-        probabilities = exp_scores / exp_scores.sum()
+        # Subtract max for numerical stability (prevents overflow), then
+        # exponentiate and normalise in place on that single buffer
+        probabilities = np.asarray(scores, dtype=np.float32) - np.max(scores)
+        np.exp(probabilities, out=probabilities)
+        probabilities /= probabilities.sum()
         
         return probabilities
     
     def _calculate_ranks(self, probabilities: np.ndarray) -> np.ndarray:
         """Calculate predicted ranks from probabilities (1 = highest prob)"""
-        # argsort twice: first gets sorting indices, second gets ranks
-        # Example: probs=[0.05, 0.204, 0.115] -> ranks=[3, 1, 2]
-        return np.argsort(np.argsort(-probabilities)) + 1
+        # One sort, then scatter 1..N into the sorted positions
+        # Example: probs=[0.05, 0.204, 0.115] -> order=[1, 2, 0] -> ranks=[3, 1, 2]
+        order = np.argsort(-probabilities, kind='stable')
+        ranks = np.empty(len(probabilities), dtype=np.int32)
+        ranks[order] = np.arange(1, len(probabilities) + 1)
+        return ranks
     
     def _calculate_confidence(self, probabilities: np.ndarray) -> str:
         """
@@ -637,41 +915,43 @@ class ModelPredictor:
         else:
             return "Low"
     
-    def _get_feature_contributions(self, features: Dict, probability: float, top_n: int = 3) -> List[Dict]:
+    def _get_feature_contributions(self, X: np.ndarray, top_n: int = 3) -> List[List[Dict]]:
         """
-        Get top N features contributing to prediction
+        Get top N features contributing to each runner's prediction
         Uses feature importance * feature value as contribution score
+        
+        Args:
+            X: Feature matrix for the race (one row per runner)
+            
+        Returns:
+            One list of up to top_n contribution dicts per row of X
         """
-        contributions = []
-        
-        for feature, value in features.items():
-            if feature in self.feature_importance and feature in self.feature_columns:
-                # Skip if value is None or 0
-                if value is None or value == 0:
-                    continue
-                
-                # Convert value to float, skip if conversion fails (e.g., '-' placeholders)
-                try:
-                    float_value = float(value)
-                except (ValueError, TypeError):
-                    continue
-                
-                if float_value == 0:
-                    continue
-                
-                importance = self.feature_importance[feature]
-                # Contribution = importance * normalized value
-                contribution = importance * float_value
-                contributions.append({
-                    'feature': feature,
-                    'value': float_value,
-                    'contribution': contribution
-                })
-        
-        # Sort by absolute contribution
-        contributions.sort(key=lambda x: abs(x['contribution']), reverse=True)
-        
-        return contributions[:top_n]
+        contribs = X * self._importance_vec
+        # Zero values (including missing/'-' placeholders) and unscored features don't contribute
+        valid = (X != 0) & self._has_importance
+        abs_contribs = np.where(valid, np.abs(contribs), -1.0)
+        
+        n_features = X.shape[1]
+        k = min(top_n, n_features)
+        if k == 0:
+            return [[] for _ in range(len(X))]
+        
+        # Unordered top-k per row, then sort just those k by descending |contribution|
+        top_idx = np.argpartition(-abs_contribs, k - 1, axis=1)[:, :k]
+        top_vals = np.take_along_axis(abs_contribs, top_idx, axis=1)
+        top_idx = np.take_along_axis(top_idx, np.argsort(-top_vals, axis=1, kind='stable'), axis=1)
+        
+        return [
+            [
+                {
+                    'feature': self.feature_columns[j],
+                    'value': float(X[i, j]),
+                    'contribution': float(contribs[i, j])
+                }
+                for j in row if valid[i, j]
+            ]
+            for i, row in enumerate(top_idx)
+        ]
     
     def _check_value_bet(self, predicted_prob: float, ofr: Optional[float]) -> Optional[str]:
         """
@@ -698,4 +978,85 @@ class ModelPredictor:
         """Close database connections"""
         if self.feature_engineer:
             self.feature_engineer.close()
+        if self._upcoming_conn is not None:
+            self._upcoming_conn.close()
+            self._upcoming_conn = None
+
 
+
+class PredictorPool:
+    """
+    One ModelPredictor per race type, created on first use
+    
+    Routes each race to the predictor for its type, so a card mixing Flat,
+    Hurdle and Chase races can be predicted without the caller juggling
+    predictors. Boosters are shared through the module-level model cache.
+    Predictors hold SQLite connections, so use a pool from a single thread.
+    """
+    
+    def __init__(self, racing_db_path: str = None):
+        self.racing_db_path = racing_db_path
+        self._predictors: Dict[str, Optional[ModelPredictor]] = {}
+    
+    def get(self, race_type: str) -> Optional[ModelPredictor]:
+        """Return the predictor for a race type, or None if no model is trained for it"""
+        if race_type not in self._predictors:
+            try:
+                self._predictors[race_type] = ModelPredictor(
+                    racing_db_path=self.racing_db_path, race_type=race_type
+                )
+            except (RuntimeError, FileNotFoundError) as e:
+                logger.warning("No %s predictor available: %s", race_type, e)
+                self._predictors[race_type] = None
+        return self._predictors[race_type]
+    
+    def predict_race(self, race_id: str, upcoming_db_path: str) -> Optional[Dict]:
+        """Predict one race with the model matching its race type"""
+        return self.predict_races([race_id], upcoming_db_path)[0]
+    
+    def predict_races(self, race_ids: List[str], upcoming_db_path: str) -> List[Optional[Dict]]:
+        """
+        Predict several races, batching per race type
+        
+        Returns:
+            List aligned with race_ids (None for skipped/failed races)
+        """
+        race_types = self._get_race_types(race_ids, upcoming_db_path)
+        
+        # Group positions by race type, keeping the caller's order within each group
+        by_type: Dict[str, List[int]] = {}
+        for idx, race_id in enumerate(race_ids):
+            race_type = race_types.get(race_id)
+            if race_type:
+                by_type.setdefault(race_type, []).append(idx)
+        
+        results = [None] * len(race_ids)
+        for race_type, positions in by_type.items():
+            predictor = self.get(race_type)
+            if predictor is None:
+                continue
+            
+            type_results = predictor.predict_races([race_ids[i] for i in positions], upcoming_db_path)
+            for idx, result in zip(positions, type_results):
+                results[idx] = result
+        
+        return results
+    
+    def _get_race_types(self, race_ids: List[str], upcoming_db_path: str) -> Dict[str, str]:
+        """Look up the race type of each race in upcoming_races.db"""
+        conn = sqlite3.connect(str(upcoming_db_path))
+        try:
+            rows = conn.execute(
+                "SELECT race_id, type FROM races WHERE race_id IN (SELECT value FROM json_each(?))",
+                (json.dumps(list(race_ids)),)
+            ).fetchall()
+        finally:
+            conn.close()
+        return dict(rows)
+    
+    def close(self):
+        """Close all predictors' database connections"""
+        for predictor in self._predictors.values():
+            if predictor is not None:
+                predictor.close()
+        self._predictors.clear()
@@ -0,0 +1,74 @@
+"""
+Checks for FeatureEngineer.compute_relative_features
+"""
+
+import copy
+import math
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from ml.feature_engineer import FeatureEngineer
+
+
+def make_field():
+    """A small field with missing values and tied ratings/weights/ages"""
+    rows = [
+        (95, 130, 4, 88.0, 0.20, 0.15, 1),
+        (None, 126, 5, None, None, 0.10, 2),
+        (95, 126, 4, 70.5, 0.05, None, 3),
+        (102, None, None, 91.0, 0.12, 0.22, None),
+        (88, 133, 6, 65.0, 0.00, 0.08, 1),
+        (None, None, 3, None, 0.30, 0.18, 4),
+    ]
+    field = []
+    for ofr, weight, age, tsr, jockey_wr, trainer_wr, style in rows:
+        features = {col: None for col in FeatureEngineer.RELATIVE_FEATURE_COLS}
+        features.update({
+            'race_id': 'rac_1',
+            'ofr': ofr,
+            'weight_lbs': weight,
+            'horse_age': age,
+            'horse_avg_tsr_last_5': tsr,
+            'jockey_win_rate_90d': jockey_wr,
+            'trainer_win_rate_90d': trainer_wr,
+            'typical_running_style': style,
+        })
+        field.append(features)
+    return field
+
+
+def same_value(a, b):
+    """Equal, treating None and NaN as the same missing value"""
+    a_missing = a is None or (isinstance(a, float) and math.isnan(a))
+    b_missing = b is None or (isinstance(b, float) and math.isnan(b))
+    if a_missing or b_missing:
+        return a_missing and b_missing
+    return math.isclose(float(a), float(b), rel_tol=1e-12, abs_tol=1e-12)
+
+
+@pytest.mark.parametrize("size", [1, 3, 6])
+def test_list_and_dataframe_inputs_agree(size):
+    engineer = FeatureEngineer(Path("unused.db"))
+    field = make_field()[:size]
+    
+    from_list = engineer.compute_relative_features(copy.deepcopy(field))
+    from_frame = engineer.compute_relative_features(pd.DataFrame(field)).to_dict('records')
+    
+    assert len(from_list) == len(from_frame) == size
+    for runner, (list_row, frame_row) in enumerate(zip(from_list, from_frame)):
+        for col in FeatureEngineer.RELATIVE_FEATURE_COLS:
+            assert same_value(list_row[col], frame_row[col]), (runner, col, list_row[col], frame_row[col])
+
+
+def test_list_input_is_updated_in_place():
+    engineer = FeatureEngineer(Path("unused.db"))
+    field = make_field()
+    
+    result = engineer.compute_relative_features(field)
+    
+    assert result is field
+    assert [f['horse_rpr_rank'] for f in field] == [2, None, 3, 1, 4, None]
+    assert [f['odds_rank'] for f in field] == [2, 5, 3, 1, 4, 6]
+    assert all(type(f['field_size']) is int for f in field)
@@ -0,0 +1,69 @@
+"""
+Checks for BaselineTrainer's temporal train/test split
+"""
+
+import random
+import sqlite3
+
+import pytest
+
+from ml.train_baseline import BaselineTrainer
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    """Small racing database: two race types, several races sharing each date"""
+    path = tmp_path / "racing_pro.db"
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE races (race_id TEXT PRIMARY KEY, date TEXT, type TEXT);
+        CREATE TABLE ml_features (
+            race_id TEXT, runner_id INTEGER, horse_id TEXT,
+            speed REAL, weight REAL
+        );
+        CREATE TABLE ml_targets (race_id TEXT, runner_id INTEGER, position INTEGER, won INTEGER);
+    """)
+    rng = random.Random(7)
+    runner_id = 0
+    for day in range(1, 29):
+        date = f"2025-02-{day:02d}"
+        for k in range(rng.randint(1, 4)):
+            race_id = f"rac_{day:02d}_{k}"
+            race_type = rng.choice(['Flat', 'Flat', 'Hurdle'])
+            conn.execute("INSERT INTO races VALUES (?, ?, ?)", (race_id, date, race_type))
+            field_size = rng.randint(4, 9)
+            for position in range(1, field_size + 1):
+                runner_id += 1
+                conn.execute("INSERT INTO ml_features VALUES (?, ?, ?, ?, ?)",
+                             (race_id, runner_id, f"hrs_{runner_id}",
+                              rng.uniform(60, 110), rng.uniform(110, 140)))
+                conn.execute("INSERT INTO ml_targets VALUES (?, ?, ?, ?)",
+                             (race_id, runner_id, position, int(position == 1)))
+    conn.commit()
+    conn.close()
+    return path
+
+
+def split_races(trainer, **kwargs):
+    """(train race_ids, test race_ids) from load_data"""
+    *_, train_df, test_df = trainer.load_data(**kwargs)
+    return set(train_df['race_id']), set(test_df['race_id'])
+
+
+@pytest.mark.parametrize("race_type", ['Flat', 'Hurdle'])
+@pytest.mark.parametrize("test_size", [0.2, 0.35])
+def test_sql_and_pandas_splits_agree(db_path, race_type, test_size):
+    trainer = BaselineTrainer(db_path, race_type=race_type, cache_dir=None)
+    trainer.connect()
+    try:
+        sql_train, sql_test = split_races(trainer, test_size=test_size)
+        
+        rows = trainer.fetch_rows(['Flat', 'Hurdle'])
+        pandas_train, pandas_test = split_races(trainer, test_size=test_size, rows=rows)
+    finally:
+        trainer.close()
+    
+    assert sql_train == pandas_train
+    assert sql_test == pandas_test
+    assert sql_train and sql_test
+    assert not sql_train & sql_test
@@ -4,14 +4,16 @@ Train Baseline ML Models
 XGBoost classifier for winner prediction
 """
 
+import hashlib
 import sqlite3
 import numpy as np
 import pandas as pd
 from pathlib import Path
 import logging
 from datetime import datetime
-from typing import Tuple, Dict, List
+from typing import Tuple, Dict, List, Optional
 import json
+import warnings
 
 logging.basicConfig(
     level=logging.INFO,
@@ -19,14 +21,192 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Prepared feature matrices are cached here between runs (see BaselineTrainer.load_data)
+DEFAULT_CACHE_DIR = Path(__file__).parent / "cache"
+
+
+# Numba is optional: with it the per-race evaluation loop runs as a parallel
+# JIT kernel, without it evaluate() uses the numpy path below
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
+# Cleared if the kernel ever fails to compile or run, so the rest of the
+# process uses the numpy path instead of raising
+_use_race_metrics_kernel = njit is not None
+
+
+if njit is not None:
+    # Compiled lazily on the first _race_metrics call and cached on disk, so
+    # later processes skip the JIT (see _run_race_metrics_kernel for the
+    # fallback when the cache can't be loaded)
+    @njit(parallel=True, cache=True)
+    def _race_metrics_kernel(actual, starts, ends, out_top1, out_top3, out_rr,
+                             out_ndcg1, out_ndcg3, out_ndcg5, out_spearman):
+        """
+        Per-race metrics over rows sorted by (race, score desc)
+        
+        Row i of a race slice has predicted rank i + 1; actual holds finishing
+        positions. Spearman is 0 for fields of <= 2.
+        """
+        for g in prange(len(starts)):
+            start = starts[g]
+            n = ends[g] - start
+            
+            top1 = 0.0
+            top3 = 0.0
+            rr = 0.0
+            ndcg1 = 0.0
+            ndcg3 = 0.0
+            ndcg5 = 0.0
+            for i in range(n):
+                if actual[start + i] == 1:
+                    gain = 1.0 / np.log2(i + 2.0)
+                    if i == 0:
+                        top1 = 1.0
+                        ndcg1 += gain
+                    if i < 3:
+                        top3 = 1.0
+                        ndcg3 += gain
+                    if i < 5:
+                        ndcg5 += gain
+                    if rr == 0.0:
+                        rr = 1.0 / (i + 1)
+            out_top1[g] = top1
+            out_top3[g] = top3
+            out_rr[g] = rr
+            out_ndcg1[g] = ndcg1
+            out_ndcg3[g] = ndcg3
+            out_ndcg5[g] = ndcg5
+            
+            if n <= 2:
+                out_spearman[g] = 0.0
+                continue
+            
+            # Spearman = 1 - 6*sum(d^2) / (n^3 - n), d = predicted rank - actual rank.
+            # Actual rank is the ordinal rank of the position within the race
+            # (positions can have gaps); ties keep predicted order (stable sort).
+            order = np.argsort(actual[start:start + n], kind='mergesort')
+            sum_d2 = 0.0
+            for actual_rank in range(n):
+                d = order[actual_rank] - actual_rank
+                sum_d2 += d * d
+            out_spearman[g] = 1.0 - 6.0 * sum_d2 / (n * (n * n - 1.0))
+
+
+def _run_race_metrics_kernel(*args) -> bool:
+    """
+    Run the metrics kernel, returning False if Numba can't compile or load it
+    
+    The on-disk cache records the importing module's name, and this file is
+    imported as both ml.train_baseline and train_baseline; a cache written
+    under the other name fails to load, so the kernel is recompiled once
+    without the cache. Any further failure switches the process to numpy.
+    """
+    global _race_metrics_kernel, _use_race_metrics_kernel
+    try:
+        _race_metrics_kernel(*args)
+        return True
+    except Exception as e:
+        logger.info(f"Cached Numba metrics kernel unusable ({e}); recompiling")
+    
+    try:
+        _race_metrics_kernel = njit(parallel=True)(_race_metrics_kernel.py_func)
+        _race_metrics_kernel(*args)
+        return True
+    except Exception as e:
+        logger.warning(f"Numba metrics kernel unavailable ({e}); using numpy path")
+        _use_race_metrics_kernel = False
+        return False
+
+
+def _race_metrics(actual_sorted: np.ndarray, race_starts: np.ndarray,
+                  race_ends: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Per-race ranking metrics for rows sorted by (race, score desc)
+    
+    Args:
+        actual_sorted: Actual finishing positions in sorted row order
+        race_starts: Index of the first row of each race
+        race_ends: Index one past the last row of each race
+        
+    Returns:
+        Dict of per-race arrays: top1, top3, rr, ndcg1, ndcg3, ndcg5, spearman
+    """
+    num_races = len(race_starts)
+    
+    if _use_race_metrics_kernel:
+        out = {key: np.empty(num_races) for key in
+               ('top1', 'top3', 'rr', 'ndcg1', 'ndcg3', 'ndcg5', 'spearman')}
+        if _run_race_metrics_kernel(
+            np.ascontiguousarray(actual_sorted, dtype=np.float64),
+            race_starts.astype(np.int64), race_ends.astype(np.int64),
+            out['top1'], out['top3'], out['rr'],
+            out['ndcg1'], out['ndcg3'], out['ndcg5'], out['spearman']
+        ):
+            return out
+    
+    sizes = race_ends - race_starts
+    codes_sorted = np.repeat(np.arange(num_races), sizes)
+    pred_rank = np.arange(len(actual_sorted)) - race_starts[codes_sorted]  # 0 = predicted winner
+    is_winner = actual_sorted == 1
+    
+    # Best-ranked winner per race (races without a recorded winner get rr = 0)
+    no_winner = len(actual_sorted)
+    winner_rank = np.minimum.reduceat(np.where(is_winner, pred_rank, no_winner), race_starts)
+    
+    # Relevance = 1 if winner, 0 otherwise; ideal DCG is 1 (winner at position 1)
+    gains = is_winner / np.log2(pred_rank + 2)
+    
+    def per_race_sum(weights):
+        return np.bincount(codes_sorted, weights=weights, minlength=num_races)
+    
+    # Spearman = 1 - 6*sum(d^2) / (n^3 - n) on ordinal ranks; a stable sort by
+    # (race, position) breaks tied positions in predicted order, like the kernel
+    by_position = np.lexsort((actual_sorted, codes_sorted))
+    actual_rank = np.empty(len(actual_sorted), dtype=np.int64)
+    actual_rank[by_position] = np.arange(len(actual_sorted)) - race_starts[codes_sorted]
+    sum_d2 = per_race_sum((pred_rank - actual_rank).astype(np.float64) ** 2)
+    n = sizes.astype(np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        spearman = np.where(sizes > 2, 1.0 - 6.0 * sum_d2 / (n * (n * n - 1.0)), 0.0)
+    
+    return {
+        'top1': is_winner[race_starts].astype(np.float64),
+        'top3': (per_race_sum(is_winner & (pred_rank < 3)) > 0).astype(np.float64),
+        'rr': np.where(winner_rank < no_winner, 1.0 / (winner_rank + 1), 0.0),
+        'ndcg1': per_race_sum(gains * (pred_rank < 1)),
+        'ndcg3': per_race_sum(gains * (pred_rank < 3)),
+        'ndcg5': per_race_sum(gains * (pred_rank < 5)),
+        'spearman': spearman,
+    }
+
 
 class BaselineTrainer:
     """Train and evaluate baseline models"""
     
+    # Histogram bins per feature (shared by the QuantileDMatrix and 'hist' params)
+    MAX_BIN = 256
+    
+    # Features missing in more than this fraction of training rows are dropped
+    MAX_NAN_FRACTION = 0.99
+    
     # Feature columns to use (will be populated from ml_features table)
-    def __init__(self, db_path: Path, race_type: str = 'Flat'):
+    # Row metadata kept alongside the features in the Feather cache
+    CACHE_META_COLS = ['race_id', 'runner_id', 'date', 'type', 'target', 'won', 'points']
+    
+    def __init__(self, db_path: Path, race_type: str = 'Flat', cache_dir: Path = DEFAULT_CACHE_DIR):
+        """
+        Args:
+            db_path: Path to racing_pro.db
+            race_type: Race type to train on ('Flat', 'Hurdle', 'Chase')
+            cache_dir: Where to cache the prepared feature matrices as Feather
+                files (None disables caching; also disabled without pyarrow)
+        """
         self.db_path = db_path
         self.race_type = race_type
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else None
         self.conn = None
         self.model = None
         self.feature_importance = None
@@ -36,6 +216,11 @@ class BaselineTrainer:
         """Connect to database"""
         self.conn = sqlite3.connect(str(self.db_path))
         self.conn.row_factory = sqlite3.Row
+        # Training is one big sequential read: larger page cache, mmap'd I/O,
+        # and in-memory temp tables for the window/sort in load_data
+        self.conn.execute("PRAGMA cache_size = -65536")
+        self.conn.execute("PRAGMA mmap_size = 268435456")
+        self.conn.execute("PRAGMA temp_store = MEMORY")
         
     def close(self):
         """Close connection"""
@@ -65,11 +250,88 @@ class BaselineTrainer:
         logger.info(f"Found {len(feature_cols)} feature columns in database")
         return feature_cols
     
-    def load_data(self, test_size: float = 0.2) -> Tuple[pd.DataFrame, pd.DataFrame, pd.Series, pd.Series, pd.DataFrame, pd.DataFrame]:
+    def _read_sql(self, query: str, params: tuple) -> pd.DataFrame:
+        """
+        Run a read-only query into a DataFrame
+        
+        Uses ConnectorX when installed: it streams SQLite results straight into
+        columnar buffers instead of boxing every cell as a Python object.
+        Falls back to pandas.read_sql_query otherwise (or if ConnectorX fails).
+        """
+        try:
+            import connectorx as cx
+        except ImportError:
+            return pd.read_sql_query(query, self.conn, params=params)
+        
+        # ConnectorX has no bound parameters for SQLite, so inline them as literals
+        def literal(value):
+            if isinstance(value, str):
+                return "'" + value.replace("'", "''") + "'"
+            return str(value)
+        
+        pieces = query.split('?')
+        if len(pieces) != len(params) + 1:
+            return pd.read_sql_query(query, self.conn, params=params)
+        inlined = pieces[0] + ''.join(literal(p) + piece for p, piece in zip(params, pieces[1:]))
+        
+        try:
+            return cx.read_sql(f"sqlite://{Path(self.db_path).resolve()}", inlined, return_type="pandas")
+        except Exception as e:
+            logger.warning(f"ConnectorX load failed ({e}), falling back to pandas")
+            return pd.read_sql_query(query, self.conn, params=params)
+    
+    def _rows_query(self, where: str) -> str:
+        """SELECT joining features, targets and race date/type, filtered by `where`"""
+        # For ranking: use position instead of binary won (lower position = better)
+        features_sql = ', '.join([f'f."{col}"' for col in self.FEATURE_COLS])
+        return f"""
+            SELECT 
+                f.race_id,
+                f.runner_id,
+                r.date,
+                r.type,
+                t.position as target,
+                t.won,
+                {features_sql}
+            FROM ml_features f
+            JOIN ml_targets t ON f.race_id = t.race_id AND f.runner_id = t.runner_id
+            JOIN races r ON f.race_id = r.race_id
+            WHERE {where}
+            ORDER BY r.date, f.race_id, t.position
+        """
+    
+    def fetch_rows(self, race_types: List[str]) -> pd.DataFrame:
+        """
+        Load feature/target rows for several race types in one query
+        
+        Pass the result to load_data(rows=...) / run_full_pipeline(rows=...)
+        for each race type to share one database read between models.
+        """
+        if self.FEATURE_COLS is None:
+            self.FEATURE_COLS = self.get_available_features()
+        logger.info(f"Loading {', '.join(race_types)} rows from database...")
+        rows = self._read_sql(self._rows_query("r.type IN (SELECT value FROM json_each(?))"),
+                              (json.dumps(list(race_types)),))
+        logger.info(f"Loaded {len(rows):,} samples")
+        return rows
+    
+    def has_feature_cache(self, test_size: float = 0.2) -> bool:
+        """Whether load_data() can be served from the Feather cache"""
+        if self.FEATURE_COLS is None:
+            self.FEATURE_COLS = self.get_available_features()
+        cache_paths = self._feature_cache_paths(test_size)
+        return bool(cache_paths) and all(path.exists() for path in cache_paths)
+    
+    def load_data(self, test_size: float = 0.2, rows: pd.DataFrame = None) -> Tuple[pd.DataFrame, pd.DataFrame, pd.Series, pd.Series, pd.DataFrame, pd.DataFrame]:
         """
         Load features and targets, split by date (temporal split)
         For ranking model: also return race_id for grouping
         
+        Args:
+            test_size: Fraction of races (latest by date) held out for testing
+            rows: Optional rows from fetch_rows() covering this race type;
+                when given, the split is done in pandas instead of SQL
+        
         Returns:
             X_train, X_test, y_train, y_test, train_df, test_df
         """
@@ -79,6 +341,18 @@ class BaselineTrainer:
         if self.FEATURE_COLS is None:
             self.FEATURE_COLS = self.get_available_features()
         
+        # Reuse the prepared matrices from a previous run on the same database
+        cache_paths = self._feature_cache_paths(test_size)
+        if cache_paths and all(path.exists() for path in cache_paths):
+            train_df = self._add_race_codes(pd.read_feather(cache_paths[0]))
+            test_df = self._add_race_codes(pd.read_feather(cache_paths[1]))
+            # The cache only holds the features that survived the constant/missing filter
+            self.FEATURE_COLS = [col for col in self.FEATURE_COLS if col in train_df.columns]
+            logger.info(f"✓ Loaded cached feature matrices ({cache_paths[0].name})")
+            logger.info(f"  Train: {len(train_df):,} samples, Test: {len(test_df):,} samples")
+            return (train_df[self.FEATURE_COLS], test_df[self.FEATURE_COLS],
+                    train_df['points'], test_df['points'], train_df, test_df)
+        
         # Show race type breakdown before filtering
         logger.info("\n" + "="*60)
         logger.info("Race counts by type in database:")
@@ -89,39 +363,55 @@ class BaselineTrainer:
             logger.info(f"  {row['type']}: {row['count']:,} races")
         logger.info("="*60 + "\n")
         
-        # Load features and targets joined together
-        # For ranking: use position instead of binary won (lower position = better)
-        # FILTER BY RACE TYPE (Flat only for focused training)
-        query = """
-            SELECT 
-                f.race_id,
-                f.runner_id,
-                r.date,
-                r.type,
-                t.position as target,
-                t.won,
-                {}
-            FROM ml_features f
-            JOIN ml_targets t ON f.race_id = t.race_id AND f.runner_id = t.runner_id
-            JOIN races r ON f.race_id = r.race_id
-            WHERE r.type = ?
-            ORDER BY r.date, f.race_id, t.position
-        """.format(', '.join([f'f."{col}"' for col in self.FEATURE_COLS]))
-        
-        df = pd.read_sql_query(query, self.conn, params=(self.race_type,))
-        
+        # Temporal split by race: the first (1 - test_size) of races by date train,
+        # the rest test. Whole dates stay on one side so no race is split.
+        if rows is not None:
+            # FILTER BY RACE TYPE on the shared rows (already ordered by date)
+            type_rows = rows[rows['type'] == self.race_type]
+            race_dates = type_rows.drop_duplicates('race_id')['date']
+            race_count = len(race_dates)
+            if race_count == 0:
+                raise ValueError(f"No {self.race_type} races with features in database")
+            split_date = race_dates.iloc[max(0, int(race_count * (1 - test_size)) - 1)]
+            
+            in_train = (type_rows['date'] <= split_date).to_numpy()
+            train_df = type_rows[in_train].reset_index(drop=True)
+            test_df = type_rows[~in_train].reset_index(drop=True)
+        else:
+            cursor.execute("""
+                SELECT COUNT(*) FROM races r
+                WHERE r.type = ? AND EXISTS (SELECT 1 FROM ml_features f WHERE f.race_id = r.race_id)
+            """, (self.race_type,))
+            race_count = cursor.fetchone()[0]
+            if race_count == 0:
+                raise ValueError(f"No {self.race_type} races with features in database")
+            
+            cursor.execute("""
+                SELECT r.date FROM races r
+                WHERE r.type = ? AND EXISTS (SELECT 1 FROM ml_features f WHERE f.race_id = r.race_id)
+                ORDER BY r.date
+                LIMIT 1 OFFSET ?
+            """, (self.race_type, max(0, int(race_count * (1 - test_size)) - 1)))
+            split_date = cursor.fetchone()[0]
+            
+            # Load features and targets joined together
+            # FILTER BY RACE TYPE (Flat only for focused training)
+            train_df = self._read_sql(self._rows_query("r.type = ? AND r.date <= ?"),
+                                      (self.race_type, split_date))
+            test_df = self._read_sql(self._rows_query("r.type = ? AND r.date > ?"),
+                                     (self.race_type, split_date))
+        
+        train_df = self._add_race_codes(train_df)
+        test_df = self._add_race_codes(test_df)
+        
+        n_samples = len(train_df) + len(test_df)
+        n_winners = train_df['won'].sum() + test_df['won'].sum()
         logger.info(f"\n✅ Training on {self.race_type} races only")
-        logger.info(f"Loaded {len(df):,} samples")
-        logger.info(f"Date range: {df['date'].min()} to {df['date'].max()}")
-        logger.info(f"Winners: {df['won'].sum():,} ({df['won'].mean()*100:.1f}%)")
-        logger.info(f"Unique races: {df['race_id'].nunique():,}")
+        logger.info(f"Loaded {n_samples:,} samples")
+        logger.info(f"Date range: {train_df['date'].min()} to {test_df['date'].max() if len(test_df) else split_date}")
+        logger.info(f"Winners: {n_winners:,} ({n_winners / max(n_samples, 1) * 100:.1f}%)")
+        logger.info(f"Unique races: {race_count:,}")
         
-        # Temporal split (earlier dates for training, later for test)
-        split_idx = int(len(df) * (1 - test_size))
-        train_df = df.iloc[:split_idx]
-        test_df = df.iloc[split_idx:]
-        
-        split_date = train_df['date'].max()
         logger.info(f"\nTrain/test split at date: {split_date}")
         logger.info(f"  Train: {len(train_df):,} samples in {train_df['race_id'].nunique():,} races")
         logger.info(f"    Date range: {train_df['date'].min()} to {train_df['date'].max()}")
@@ -135,22 +425,9 @@ class BaselineTrainer:
         # CRITICAL: Convert position to points for ranking objective
         # Ranking models expect HIGHER values = BETTER performance
         # Position 1 (winner) should have highest value, not lowest!
-        # Points system: In each race, winner gets max_position points, last gets 1 point
         logger.info("\nConverting positions to points (higher = better)...")
-        train_df['max_position'] = train_df.groupby('race_id')['target'].transform('max')
-        test_df['max_position'] = test_df.groupby('race_id')['target'].transform('max')
-        
-        y_train = train_df['max_position'] - train_df['target'] + 1
-        y_test = test_df['max_position'] - test_df['target'] + 1
-        
-        # Cap at 31 for XGBoost NDCG compatibility (required in some versions)
-        y_train = y_train.clip(upper=31)
-        y_test = y_test.clip(upper=31)
-        
-        # Example: 10-horse race
-        #   Position 1 (winner): 10 - 1 + 1 = 10 points (highest)
-        #   Position 5: 10 - 5 + 1 = 6 points
-        #   Position 10 (last): 10 - 10 + 1 = 1 point (lowest)
+        y_train = self._add_points(train_df)['points']
+        y_test = self._add_points(test_df)['points']
         
         logger.info(f"  Position → Points conversion:")
         logger.info(f"  Winner (pos 1) → {y_train.max():.0f} points (max)")
@@ -159,24 +436,124 @@ class BaselineTrainer:
         
         # Convert all features to numeric (coerce errors to NaN)
         logger.info("Converting features to numeric types...")
-        for col in X_train.columns:
-            X_train[col] = pd.to_numeric(X_train[col], errors='coerce')
-            X_test[col] = pd.to_numeric(X_test[col], errors='coerce')
+        X_train = X_train.apply(pd.to_numeric, errors='coerce')
+        X_test = X_test.apply(pd.to_numeric, errors='coerce')
         
-        # Handle missing values (fill with median for numeric)
+        # Missing-value fraction has to be measured before imputation hides it
+        nan_frac = X_train.isna().mean().to_numpy()
+        
+        # Handle missing values (fill with training-set median; 0 if a column is all NaN)
         logger.info("Imputing missing values with median...")
-        for col in X_train.columns:
-            median_val = X_train[col].median()
-            if pd.isna(median_val):
-                median_val = 0  # If all values are NaN, use 0
-            X_train[col] = X_train[col].fillna(median_val)
-            X_test[col] = X_test[col].fillna(median_val)
+        medians = X_train.median(numeric_only=True).fillna(0)
+        X_train = X_train.fillna(medians)
+        X_test = X_test.fillna(medians)
+        
+        # Drop features that can't split anything: constant, or almost entirely
+        # imputed. Saving the reduced FEATURE_COLS keeps the predictor in sync.
+        nunique = X_train.nunique(dropna=False).to_numpy()
+        useless = (nunique <= 1) | (nan_frac > self.MAX_NAN_FRACTION)
+        if useless.any():
+            dropped = X_train.columns[useless].tolist()
+            logger.info(f"Dropping {len(dropped)} constant/mostly-missing features: {', '.join(dropped)}")
+            X_train = X_train.loc[:, ~useless]
+            X_test = X_test.loc[:, ~useless]
+            self.FEATURE_COLS = X_train.columns.tolist()
+        
+        # XGBoost works in float32 internally; casting here halves the matrices
+        # and saves it a conversion copy when building the DMatrix
+        X_train = X_train.astype(np.float32, copy=False)
+        X_test = X_test.astype(np.float32, copy=False)
+        y_train = y_train.astype(np.float32)
+        y_test = y_test.astype(np.float32)
         
         logger.info(f"\nFeature matrix shape: {X_train.shape}")
         logger.info(f"Features: {len(self.FEATURE_COLS)}")
         
+        if cache_paths:
+            self._write_feature_cache(cache_paths, (train_df, X_train, y_train), (test_df, X_test, y_test))
+        
         return X_train, X_test, y_train, y_test, train_df, test_df
     
+    @staticmethod
+    def _add_race_codes(df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Add a 'race_code' column numbering races in row order
+        
+        Rows come back ordered by date then race_id, so each race is one
+        contiguous block: a new code starts wherever race_id differs from the
+        previous row (no hashing of the id strings), and np.bincount(race_code)
+        gives the group sizes in row order.
+        """
+        race_ids = df['race_id'].to_numpy()
+        starts_race = np.ones(len(race_ids), dtype=bool)
+        starts_race[1:] = race_ids[1:] != race_ids[:-1]
+        df['race_code'] = (np.cumsum(starts_race) - 1).astype(np.int32)
+        return df
+    
+    @staticmethod
+    def _add_points(df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Add a 'points' ranking label: max_position - position + 1 within each race
+        
+        Points system: In each race, winner gets max_position points, last gets 1 point
+        Capped at 31 for XGBoost NDCG compatibility (required in some versions)
+        Example: 10-horse race
+          Position 1 (winner): 10 - 1 + 1 = 10 points (highest)
+          Position 5: 10 - 5 + 1 = 6 points
+          Position 10 (last): 10 - 10 + 1 = 1 point (lowest)
+        
+        Races are contiguous blocks (see _add_race_codes), so the per-race max
+        is a single np.maximum.reduceat over the block starts.
+        """
+        if df.empty:
+            df['points'] = np.empty(0, dtype=np.float32)
+            return df
+        
+        target = df['target'].to_numpy()
+        sizes = np.bincount(df['race_code'])
+        starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+        race_max = np.maximum.reduceat(target, starts)
+        df['points'] = np.minimum(np.repeat(race_max, sizes) - target + 1, 31).astype(np.float32)
+        return df
+    
+    def _feature_cache_paths(self, test_size: float) -> Optional[Tuple[Path, Path]]:
+        """
+        Feather cache files (train, test) for the current database state
+        
+        The key covers the database mtime, race type, split size and feature
+        list, so any change to the data or features misses the cache.
+        Returns None when caching is disabled or pyarrow isn't installed.
+        """
+        if self.cache_dir is None:
+            return None
+        try:
+            import pyarrow  # noqa: F401 - Feather I/O backend
+        except ImportError:
+            return None
+        
+        key_source = "|".join([
+            str(Path(self.db_path).stat().st_mtime_ns), self.race_type, str(test_size),
+            ",".join(self.FEATURE_COLS)
+        ])
+        key = hashlib.sha1(key_source.encode()).hexdigest()[:12]
+        prefix = f"{self.race_type.lower()}_features_{key}"
+        return self.cache_dir / f"{prefix}_train.feather", self.cache_dir / f"{prefix}_test.feather"
+    
+    def _write_feature_cache(self, cache_paths: Tuple[Path, Path], *splits):
+        """Save (df, X, y) splits to the Feather cache, replacing stale files for this race type"""
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            for stale in self.cache_dir.glob(f"{self.race_type.lower()}_features_*.feather"):
+                if stale not in cache_paths:
+                    stale.unlink()
+            
+            for path, (df, X, y) in zip(cache_paths, splits):
+                meta = df[self.CACHE_META_COLS].assign(points=y)
+                pd.concat([meta, X], axis=1).reset_index(drop=True).to_feather(path)
+            logger.info(f"✓ Cached feature matrices to {self.cache_dir}")
+        except OSError as e:
+            logger.warning(f"Could not write feature cache: {e}")
+    
     def train_xgboost(self, X_train: pd.DataFrame, y_train: pd.Series, 
                      train_df: pd.DataFrame,
                      X_val: pd.DataFrame = None, y_val: pd.Series = None,
@@ -198,27 +575,43 @@ class BaselineTrainer:
         # === RACE GROUPING (CRITICAL FOR RANKING) ===
         # Group samples by race_id so model knows which horses compete together
         logger.info("\nPreparing race groups...")
-        train_groups = train_df.groupby('race_id').size().values
+        train_groups = np.bincount(train_df['race_code'])
         logger.info(f"  Training races: {len(train_groups)}")
         logger.info(f"  Avg runners per race: {train_groups.mean():.1f}")
         logger.info(f"  Min/Max runners: {train_groups.min()}/{train_groups.max()}")
         
         # Create DMatrix with group information
-        dtrain = xgb.DMatrix(X_train, label=y_train)
+        # QuantileDMatrix pre-bins features for 'hist' and stores bin indices
+        # instead of raw floats - less memory and no re-binning during training
+        # Pass the float32 block as an ndarray (not the DataFrame) so XGBoost reads
+        # it through the array interface instead of converting column by column
+        feature_names = list(X_train.columns)
+        dtrain = xgb.QuantileDMatrix(
+            X_train.to_numpy(dtype=np.float32), label=np.asarray(y_train, dtype=np.float32),
+            feature_names=feature_names, max_bin=self.MAX_BIN
+        )
         dtrain.set_group(train_groups)  # THIS IS THE KEY: tells model which samples are in same race
         
         # Validation set (if provided)
         if X_val is not None and y_val is not None and test_df is not None:
-            test_groups = test_df.groupby('race_id').size().values
-            dtest = xgb.DMatrix(X_val, label=y_val)
+            test_groups = np.bincount(test_df['race_code'])
+            # ref=dtrain reuses the training quantile cuts so both sets share bins
+            dtest = xgb.QuantileDMatrix(
+                X_val.to_numpy(dtype=np.float32), label=np.asarray(y_val, dtype=np.float32),
+                feature_names=feature_names, ref=dtrain, max_bin=self.MAX_BIN
+            )
             dtest.set_group(test_groups)
-            eval_list = [(dtrain, 'train'), (dtest, 'eval')]
+            # Only the validation set is evaluated: scoring NDCG on the whole
+            # training set every round would double evaluation cost for nothing
+            eval_list = [(dtest, 'eval')]
             logger.info(f"  Test races: {len(test_groups)}")
         else:
             eval_list = [(dtrain, 'train')]
             dtest = None
         
         # === RANKING PARAMETERS ===
+        device = self._training_device(xgb)
+        logger.info(f"  Training device: {device}")
         params = {
             'objective': 'rank:pairwise',  # Pairwise ranking loss - learns which horse beats which
             'eval_metric': 'ndcg@3',       # Normalized Discounted Cumulative Gain for top 3
@@ -229,24 +622,30 @@ class BaselineTrainer:
             'subsample': 0.8,
             'colsample_bytree': 0.8,
             'tree_method': 'hist',          # Fast histogram-based method
+            'max_bin': self.MAX_BIN,        # Must match the QuantileDMatrix binning
+            'device': device,               # GPU 'hist' when a CUDA build + GPU is available
             'random_state': 42,
             'nthread': -1
         }
         
+        # n_estimators is the boosting round count for xgb.train, not a booster param
+        num_rounds = params.pop('n_estimators')
+        
         logger.info("\nModel parameters:")
         for key, val in params.items():
             logger.info(f"  {key}: {val}")
+        logger.info(f"  num_boost_round: {num_rounds}")
         
         # === TRAIN MODEL ===
         logger.info("\nTraining...")
-        num_rounds = params.pop('n_estimators')
         
         model = xgb.train(
             params,
             dtrain,
             num_boost_round=num_rounds,
             evals=eval_list,
-            early_stopping_rounds=20 if dtest else None,
+            early_stopping_rounds=20 if dtest is not None else None,
+            maximize=True,  # NDCG: higher is better
             verbose_eval=50  # Print every 50 rounds
         )
         
@@ -271,58 +670,68 @@ class BaselineTrainer:
         
         return model
     
+    @staticmethod
+    def _training_device(xgb) -> str:
+        """
+        'cuda' if this XGBoost build has CUDA support and a GPU is visible, else 'cpu'
+        
+        The histogram construction in 'hist' is what dominates training time,
+        and XGBoost's GPU implementation is a drop-in replacement for it.
+        """
+        if not xgb.build_info().get('USE_CUDA'):
+            return 'cpu'
+        # Probe through XGBoost itself with one round on a two-row matrix.
+        # Without a visible GPU it warns and falls back to the CPU, which
+        # shows up as the device recorded in the booster's config.
+        try:
+            probe = xgb.DMatrix(np.zeros((2, 1)), label=np.zeros(2))
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                booster = xgb.train({'device': 'cuda', 'tree_method': 'hist'}, probe,
+                                    num_boost_round=1)
+            config = json.loads(booster.save_config())
+            return 'cuda' if config['learner']['generic_param']['device'].startswith('cuda') else 'cpu'
+        except Exception:
+            return 'cpu'
+    
     def evaluate(self, model, X_test: pd.DataFrame, y_test: pd.Series, 
                 test_df: pd.DataFrame) -> Dict:
         """
         Evaluate RANKING model performance
         Uses ranking-specific metrics (NDCG, MRR, Spearman)
         """
-        import xgboost as xgb
-        from scipy.stats import spearmanr
-        
         logger.info("\n" + "="*60)
         logger.info("RANKING MODEL EVALUATION")
         logger.info("="*60)
         
         # === PREDICT RANKING SCORES ===
-        dtest = xgb.DMatrix(X_test)
-        ranking_scores = model.predict(dtest)
-        
-        # Add scores to test dataframe
-        test_df = test_df.copy()
-        test_df['ranking_score'] = ranking_scores
-        test_df['actual_position'] = test_df['target'].values  # Use original position, not points!
+        # Score the float32 block directly - no DMatrix build, no copy of test_df
+        ranking_scores = model.inplace_predict(X_test.to_numpy(dtype=np.float32))
+        actual_position = test_df['target'].to_numpy()  # Use original position, not points!
+        
+        # === PER-RACE RANKS ===
+        # Sort once by (race, score desc); every metric below is a reduction over
+        # the predicted rank within each race, so no per-race DataFrames are built
+        race_codes = test_df['race_code'].to_numpy()
+        num_races = int(race_codes.max()) + 1 if len(race_codes) else 0
+        order = np.lexsort((-ranking_scores, race_codes))
+        codes_sorted = race_codes[order]
+        actual_sorted = actual_position[order]
+        race_starts = np.searchsorted(codes_sorted, np.arange(num_races))
+        race_ends = np.append(race_starts[1:], len(order))
+        per_race = _race_metrics(actual_sorted, race_starts, race_ends)
         
         # === RACING-SPECIFIC METRICS ===
         logger.info("\n🏇 RACING METRICS")
         
         # Top pick accuracy (highest score in each race = prediction winner)
-        def get_race_metrics(race_df):
-            # Sort by ranking score (higher = better)
-            race_df = race_df.sort_values('ranking_score', ascending=False)
-            race_df['pred_rank'] = range(1, len(race_df) + 1)
-            
-            # Top pick = predicted winner
-            top_pick_wins = race_df.iloc[0]['actual_position'] == 1
-            
-            # Top 3 hit rate = is actual winner in predicted top 3?
-            actual_winner = race_df[race_df['actual_position'] == 1]
-            top_3_hit = len(actual_winner[actual_winner['pred_rank'] <= 3]) > 0 if len(actual_winner) > 0 else False
-            
-            # Spearman correlation between predicted and actual ranks
-            spearman_corr = spearmanr(race_df['pred_rank'], race_df['actual_position'])[0] if len(race_df) > 2 else 0
-            
-            return {
-                'top_pick_wins': top_pick_wins,
-                'top_3_hit': top_3_hit,
-                'spearman': spearman_corr
-            }
+        top_pick_accuracy = per_race['top1'].mean()
         
-        race_results = test_df.groupby('race_id').apply(get_race_metrics)
+        # Top 3 hit rate = is actual winner in predicted top 3?
+        top_3_hit_rate = per_race['top3'].mean()
         
-        top_pick_accuracy = sum(r['top_pick_wins'] for r in race_results) / len(race_results)
-        top_3_hit_rate = sum(r['top_3_hit'] for r in race_results) / len(race_results)
-        avg_spearman = np.mean([r['spearman'] for r in race_results if not np.isnan(r['spearman'])])
+        # Spearman correlation between predicted and actual ranks
+        avg_spearman = np.nanmean(per_race['spearman'])
         
         logger.info(f"  Top Pick Win Rate: {top_pick_accuracy:.4f} ({top_pick_accuracy*100:.1f}%)")
         logger.info(f"  Top 3 Hit Rate: {top_3_hit_rate:.4f} ({top_3_hit_rate*100:.1f}%)")
@@ -332,47 +741,24 @@ class BaselineTrainer:
         logger.info("\n📊 RANKING QUALITY METRICS")
         
         # Mean Reciprocal Rank (MRR) - average of 1/rank for actual winners
-        def get_mrr(race_df):
-            race_df = race_df.sort_values('ranking_score', ascending=False)
-            race_df['pred_rank'] = range(1, len(race_df) + 1)
-            winner = race_df[race_df['actual_position'] == 1]
-            if len(winner) > 0:
-                return 1.0 / winner.iloc[0]['pred_rank']
-            return 0
-        
-        mrr = test_df.groupby('race_id').apply(get_mrr).mean()
+        mrr = per_race['rr'].mean()
         logger.info(f"  Mean Reciprocal Rank (MRR): {mrr:.4f}")
         
         # NDCG@K for different K values
-        def dcg_at_k(race_df, k):
-            """Discounted Cumulative Gain at K"""
-            race_df = race_df.sort_values('ranking_score', ascending=False).head(k)
-            # Relevance = 1 if winner, 0 otherwise
-            race_df['relevance'] = (race_df['actual_position'] == 1).astype(int)
-            dcg = sum(race_df['relevance'] / np.log2(np.arange(2, len(race_df) + 2)))
-            return dcg
-        
-        def ndcg_at_k(race_df, k):
-            """Normalized DCG at K"""
-            actual_dcg = dcg_at_k(race_df, k)
-            # Ideal DCG (winner at position 1)
-            ideal_dcg = 1.0  # log2(2) = 1
-            return actual_dcg / ideal_dcg if ideal_dcg > 0 else 0
-        
+        ndcg = {}
         for k in [1, 3, 5]:
-            ndcg_k = test_df.groupby('race_id').apply(lambda df: ndcg_at_k(df, k)).mean()
-            logger.info(f"  NDCG@{k}: {ndcg_k:.4f}")
+            ndcg[k] = per_race[f'ndcg{k}'].mean()
+            logger.info(f"  NDCG@{k}: {ndcg[k]:.4f}")
         
         # === POSITION DISTRIBUTION ===
         logger.info("\n📈 PREDICTED WINNER POSITION DISTRIBUTION")
-        test_df_sorted = test_df.sort_values(['race_id', 'ranking_score'], ascending=[True, False])
-        test_df_sorted['pred_rank'] = test_df_sorted.groupby('race_id').cumcount() + 1
-        predicted_winners = test_df_sorted[test_df_sorted['pred_rank'] == 1]
-        
-        pos_dist = predicted_winners['actual_position'].value_counts().sort_index()
-        for pos, count in pos_dist.head(10).items():
-            pct = count / len(predicted_winners) * 100
-            logger.info(f"  Position {int(pos)}: {count:4d} races ({pct:5.1f}%)")
+        # First row of each race block is its top-scored runner; 10th and worse share a bucket
+        winner_positions = actual_sorted[race_starts].astype(np.int64)
+        pos_counts = np.bincount(np.minimum(winner_positions, 10), minlength=11)
+        for pos in np.flatnonzero(pos_counts):
+            label = f"{pos}+" if pos == 10 else f"{pos}"
+            pct = pos_counts[pos] / num_races * 100
+            logger.info(f"  Position {label}: {pos_counts[pos]:4d} races ({pct:5.1f}%)")
         
         # === SUMMARY ===
         metrics = {
@@ -380,10 +766,10 @@ class BaselineTrainer:
             'top_3_hit_rate': top_3_hit_rate,
             'mean_reciprocal_rank': mrr,
             'avg_spearman': avg_spearman,
-            'ndcg@1': test_df.groupby('race_id').apply(lambda df: ndcg_at_k(df, 1)).mean(),
-            'ndcg@3': test_df.groupby('race_id').apply(lambda df: ndcg_at_k(df, 3)).mean(),
-            'ndcg@5': test_df.groupby('race_id').apply(lambda df: ndcg_at_k(df, 5)).mean(),
-            'num_test_races': len(race_results)
+            'ndcg@1': ndcg[1],
+            'ndcg@3': ndcg[3],
+            'ndcg@5': ndcg[5],
+            'num_test_races': num_races
         }
         
         return metrics
@@ -411,8 +797,14 @@ class BaselineTrainer:
             json.dump(self.FEATURE_COLS, f, indent=2)
         logger.info(f"✓ Feature columns saved to {features_path}")
     
-    def run_full_pipeline(self, test_size: float = 0.2, save_dir: Path = None):
-        """Run complete training and evaluation pipeline"""
+    def run_full_pipeline(self, test_size: float = 0.2, save_dir: Path = None,
+                          rows: pd.DataFrame = None):
+        """
+        Run complete training and evaluation pipeline
+        
+        Args:
+            rows: Optional pre-loaded rows from fetch_rows() (see train_race_types)
+        """
         logger.info("="*60)
         logger.info("RANKING MODEL TRAINING PIPELINE")
         logger.info("="*60)
@@ -421,7 +813,7 @@ class BaselineTrainer:
         
         try:
             # Load data
-            X_train, X_test, y_train, y_test, train_df, test_df = self.load_data(test_size)
+            X_train, X_test, y_train, y_test, train_df, test_df = self.load_data(test_size, rows=rows)
             
             # Train model (pass train_df and test_df for race grouping)
             model = self.train_xgboost(
@@ -454,6 +846,51 @@ class BaselineTrainer:
             self.close()
 
 
+def train_race_types(db_path: Path, race_types: List[str], test_size: float = 0.2,
+                     save_dir: Path = None, cache_dir: Path = DEFAULT_CACHE_DIR) -> Dict[str, Tuple]:
+    """
+    Train one model per race type from a single shared database read
+    
+    Feature discovery and the SQLite query run once for all race types that
+    aren't already in the feature cache; each model then splits its own rows
+    out of the shared DataFrame.
+    
+    Returns:
+        Dict of race type -> (model, metrics), or None for race types that failed
+    """
+    loader = BaselineTrainer(db_path, race_type=race_types[0], cache_dir=cache_dir)
+    loader.connect()
+    try:
+        feature_cols = loader.get_available_features()
+        
+        uncached = []
+        for race_type in race_types:
+            probe = BaselineTrainer(db_path, race_type=race_type, cache_dir=cache_dir)
+            probe.FEATURE_COLS = feature_cols
+            if not probe.has_feature_cache(test_size):
+                uncached.append(race_type)
+        
+        loader.FEATURE_COLS = feature_cols
+        rows = loader.fetch_rows(uncached) if uncached else None
+    finally:
+        loader.close()
+    
+    results = {}
+    for race_type in race_types:
+        logger.info(f"Training model for {race_type} racing")
+        trainer = BaselineTrainer(db_path, race_type=race_type, cache_dir=cache_dir)
+        trainer.FEATURE_COLS = feature_cols
+        try:
+            results[race_type] = trainer.run_full_pipeline(
+                test_size=test_size, save_dir=save_dir, rows=rows
+            )
+        except Exception as e:
+            logger.error(f"{race_type} training failed: {e}")
+            results[race_type] = None
+    
+    return results
+
+
 def main():
     """Main execution"""
     import argparse
@@ -466,6 +903,12 @@ def main():
     parser.add_argument('--race-type', type=str, default='Flat',
                        choices=['Flat', 'Hurdle', 'Chase'],
                        help='Race type to train on (default: Flat)')
+    parser.add_argument('--race-types', type=str, nargs='+',
+                       choices=['Flat', 'Hurdle', 'Chase'],
+                       help='Train several race types in one run, sharing one data load '
+                            '(overrides --race-type)')
+    parser.add_argument('--no-cache', action='store_true',
+                       help='Always rebuild the feature matrix from the database')
     
     args = parser.parse_args()
     
@@ -477,8 +920,17 @@ def main():
     
     output_dir = Path(__file__).parent / args.output_dir
     
+    cache_dir = None if args.no_cache else DEFAULT_CACHE_DIR
+    
+    if args.race_types:
+        results = train_race_types(
+            db_path, args.race_types, test_size=args.test_size,
+            save_dir=output_dir, cache_dir=cache_dir
+        )
+        return 0 if all(result is not None for result in results.values()) else 1
+    
     logger.info(f"Training model for {args.race_type} racing")
-    trainer = BaselineTrainer(db_path, race_type=args.race_type)
+    trainer = BaselineTrainer(db_path, race_type=args.race_type, cache_dir=cache_dir)
     
     try:
         model, metrics = trainer.run_full_pipeline(
@@ -4,86 +4,483 @@ Query Racecards Pro Database - Interactive Query Tool
 Provides common queries and examples for exploring the racing data
 """
 
+import csv
 import sqlite3
 import sys
+from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 
 DB_PATH = Path(__file__).parent / "racing_pro.db"
 
+# Read-side tuning for the interactive session: 128MB page cache, 256MB mmap,
+# in-memory temp B-trees (ORDER BY / GROUP BY), and refuse any writes.
+READ_PRAGMAS = (
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-131072",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA query_only=1",
+)
+
+
+def apply_read_pragmas(conn):
+    """Apply the read-only tuning PRAGMAs to a connection"""
+    for pragma in READ_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+# Trigram FTS5 indexes (built by fetch_racecards_pro.create_search_indexes)
+# backing the partial-name lookups. They are strictly an optimisation: every
+# lookup falls back to a plain LIKE scan when its index is missing, out of
+# step, or finds nothing. These (indexed, current) row-count queries tell
+# whether an index is in step with its source table.
+SEARCH_INDEX_COUNTS = {
+    'horses_fts': ("SELECT COUNT(*), MAX(id) FROM horses_fts_docsize",
+                   "SELECT COUNT(*), MAX(rowid) FROM horses"),
+    'trainers_fts': ("SELECT COUNT(*), MAX(id) FROM trainers_fts_docsize",
+                     "SELECT COUNT(*), MAX(rowid) FROM trainers"),
+    'courses_fts': ("SELECT COUNT(*), NULL FROM courses_fts",
+                    "SELECT COUNT(DISTINCT course), NULL FROM races"),
+}
+
+
+def search_index_counts(conn, fts_table: str) -> Tuple[Tuple, Tuple]:
+    """Return the (indexed, current) row counts of a search index and its source"""
+    indexed_sql, current_sql = SEARCH_INDEX_COUNTS[fts_table]
+    return conn.execute(indexed_sql).fetchone(), conn.execute(current_sql).fetchone()
+
+
+def search_index_in_sync(conn, fts_table: str) -> bool:
+    """Check whether an FTS5 search index exists and matches its source table
+    
+    Rows added or removed since the last rebuild (e.g. by the GUI fetchers)
+    put the index out of step; lookups then use the plain LIKE scan.
+    """
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (fts_table,)
+    ).fetchone() is not None
+    if not exists:
+        return False
+    indexed, current = search_index_counts(conn, fts_table)
+    return tuple(indexed) == tuple(current)
+
+
+def search_rows(conn, sql: str, fts_table: str, fts_filter: str, plain_filter: str,
+                pattern: str) -> List:
+    """Run a name-filtered lookup, using the FTS index only as a shortcut
+    
+    sql has a {name_filter} placeholder. fts_filter is tried first when the
+    index is in step; an empty result is re-checked with plain_filter, since
+    an edited row the index has not caught up with would otherwise be missed.
+    """
+    if search_index_in_sync(conn, fts_table):
+        rows = conn.execute(sql.format(name_filter=fts_filter),
+                            (pattern,) * fts_filter.count('?')).fetchall()
+        if rows:
+            return rows
+    return conn.execute(sql.format(name_filter=plain_filter), (pattern,)).fetchall()
+
+
 def connect_db():
-    """Connect to the database"""
+    """Connect to the database (read-only, shared for the whole session)"""
     if not DB_PATH.exists():
         print(f"Error: Database not found at {DB_PATH}")
         print("Run fetch_racecards_pro.py first to create the database.")
         sys.exit(1)
-    return sqlite3.connect(DB_PATH)
+    conn = sqlite3.connect(
+        f"{DB_PATH.resolve().as_uri()}?mode=ro",
+        uri=True,
+        isolation_level=None,
+        cached_statements=512,
+    )
+    # Rows are addressed by column name, so renderers don't depend on SELECT order
+    conn.row_factory = sqlite3.Row
+    return apply_read_pragmas(conn)
 
 
-def print_table(headers: List[str], rows: List[Tuple], max_width: int = 30):
-    """Print results in a formatted table"""
-    # Calculate column widths
-    col_widths = []
-    for i, header in enumerate(headers):
-        max_len = len(str(header))
-        for row in rows:
-            if i < len(row):
-                max_len = max(max_len, len(str(row[i])))
-        col_widths.append(min(max_len, max_width))
-    
-    # Print header
+# Fixed-shape statements, kept as module constants so every call passes the
+# identical SQL string and reuses the connection's prepared-statement cache.
+# Date range and race count come from one pass over races (idx_races_date
+# covers it); the other tables' counts ride along as scalar subqueries, so
+# the statistics screen is a single statement
+DATABASE_STATS_SQL = """
+    SELECT MIN(date), MAX(date), COUNT(DISTINCT date), COUNT(*),
+           (SELECT COUNT(*) FROM runners),
+           (SELECT COUNT(*) FROM horses),
+           (SELECT COUNT(*) FROM trainers),
+           (SELECT COUNT(*) FROM jockeys),
+           (SELECT COUNT(*) FROM owners)
+    FROM races
+"""
+
+# The date and race-card screens are served in order by idx_races_date_offtime
+# and idx_runners_race_number (fetch_racecards_pro.create_indexes)
+RACES_BY_DATE_SQL = """
+    SELECT race_id, course, off_time, race_name, field_size
+    FROM races
+    WHERE date = ?
+    ORDER BY off_time
+"""
+
+RACE_INFO_SQL = """
+    SELECT date, course, off_time, race_name, distance, going, 
+           surface, race_class, field_size
+    FROM races
+    WHERE race_id = ?
+"""
+
+RACE_RUNNERS_SQL = """
+    SELECT 
+        ru.number,
+        h.name,
+        t.name,
+        j.name,
+        ru.draw,
+        ru.lbs
+    FROM runners ru
+    LEFT JOIN horses h ON ru.horse_id = h.horse_id
+    LEFT JOIN trainers t ON ru.trainer_id = t.trainer_id
+    LEFT JOIN jockeys j ON ru.jockey_id = j.jockey_id
+    WHERE ru.race_id = ?
+    ORDER BY CAST(ru.number AS INTEGER)
+"""
+
+COURSE_STATS_SQL = """
+    SELECT 
+        course,
+        COUNT(*) as race_count,
+        MIN(date) as first_race,
+        MAX(date) as last_race
+    FROM races
+    WHERE {name_filter}
+    GROUP BY course
+"""
+
+COURSE_RECENT_RACES_SQL = """
+    SELECT date, race_name, field_size
+    FROM races
+    WHERE course = ?
+    ORDER BY date DESC
+    LIMIT 5
+"""
+
+# Single-statement detail lookups: the matched row is resolved in a CTE and its
+# recent runs are joined on, so each lookup is one prepare/step cycle.
+# {name_filter} is either a plain LIKE or the FTS-prefiltered LIKE.
+HORSE_DETAILS_SQL = """
+    WITH h AS (
+        SELECT 
+            h.horse_id,
+            h.name,
+            h.age,
+            h.sex,
+            h.colour,
+            d.name as dam,
+            s.name as sire,
+            ds.name as damsire,
+            (SELECT t.name
+             FROM runners ru
+             LEFT JOIN trainers t ON ru.trainer_id = t.trainer_id
+             WHERE ru.horse_id = h.horse_id
+             LIMIT 1) as current_trainer
+        FROM horses h
+        LEFT JOIN dams d ON h.dam_id = d.dam_id
+        LEFT JOIN sires s ON h.sire_id = s.sire_id
+        LEFT JOIN damsires ds ON h.damsire_id = ds.damsire_id
+        WHERE {name_filter}
+        LIMIT 1
+    ),
+    runs AS (
+        SELECT 
+            ru.horse_id,
+            r.date,
+            r.course,
+            r.race_name,
+            ru.number,
+            r.race_id
+        FROM h
+        JOIN runners ru ON ru.horse_id = h.horse_id
+        JOIN races r ON ru.race_id = r.race_id
+        ORDER BY r.date DESC, r.race_id DESC
+        LIMIT 10
+    )
+    SELECT h.*, runs.horse_id as run_horse_id, runs.date, runs.course, runs.race_name,
+           runs.number, runs.race_id
+    FROM h
+    LEFT JOIN runs ON runs.horse_id = h.horse_id
+    ORDER BY runs.date DESC, runs.race_id DESC
+"""
+
+# Keyset-paged run history: the page cursor is the (date, race_id) of the last
+# run shown, so any page is the same seek + LIMIT with no OFFSET rows to skip,
+# and runs sharing the boundary date are not lost between pages
+RECENT_RUNS_PAGE = 10
+
+RECENT_RUNS_SQL = """
+    SELECT 
+        r.date,
+        r.course,
+        r.race_name,
+        ru.number,
+        r.race_id
+    FROM runners ru
+    JOIN races r ON ru.race_id = r.race_id
+    WHERE ru.horse_id = ? AND (? IS NULL OR (r.date, r.race_id) < (?, ?))
+    ORDER BY r.date DESC, r.race_id DESC
+    LIMIT ?
+"""
+
+TRAINER_STATS_SQL = """
+    WITH t AS (
+        SELECT trainer_id, name, location
+        FROM trainers
+        WHERE {name_filter}
+        LIMIT 1
+    ),
+    runs AS (
+        SELECT 
+            ru.trainer_id,
+            r.date,
+            r.course,
+            h.name as horse,
+            r.race_name
+        FROM t
+        JOIN runners ru ON ru.trainer_id = t.trainer_id
+        JOIN races r ON ru.race_id = r.race_id
+        JOIN horses h ON ru.horse_id = h.horse_id
+        ORDER BY r.date DESC
+        LIMIT 10
+    )
+    SELECT 
+        t.trainer_id,
+        t.name,
+        t.location,
+        (SELECT COUNT(*) FROM runners WHERE trainer_id = t.trainer_id) as runner_count,
+        runs.trainer_id as run_trainer_id,
+        runs.date,
+        runs.course,
+        runs.horse,
+        runs.race_name
+    FROM t
+    LEFT JOIN runs ON runs.trainer_id = t.trainer_id
+    ORDER BY runs.date DESC
+"""
+
+
+# Menu results longer than this are dumped as CSV (with a notice on stderr):
+# one C-level csv.writer call instead of padding every cell, and easier to
+# pipe elsewhere. Custom queries choose CSV explicitly.
+FAST_DUMP_ROWS = 500
+
+
+def _fast_dump(headers: List[str], rows) -> None:
+    """Write a header and rows to stdout as CSV"""
+    writer = csv.writer(sys.stdout, lineterminator="\n")
+    writer.writerow(headers)
+    writer.writerows(rows)
+
+
+def _table_layout(headers: List[str], cells: List[Tuple[str, ...]], max_width: int):
+    """Return (header_row, row_format) sized to the widest cell per column"""
+    # Take each column's widest cell in one zip pass (rows are uniform:
+    # they all come from one cursor)
+    col_widths = [
+        min(max(map(len, col)), max_width)
+        for col in zip(tuple(map(str, headers)), *cells)
+    ]
+    
+    # One fixed-width, truncating format for every row
+    row_fmt = " | ".join(f"{{:<{w}.{w}}}" for w in col_widths)
+    
+    # Header is padded but never truncated
     header_row = " | ".join(str(h).ljust(w) for h, w in zip(headers, col_widths))
-    print(header_row)
-    print("-" * len(header_row))
+    return header_row, row_fmt
+
+
+def print_table(headers: List[str], rows: List[Tuple], max_width: int = 30):
+    """Print results in a formatted table (CSV for large results)"""
+    if len(rows) > FAST_DUMP_ROWS:
+        print(f"({len(rows)} rows: writing CSV instead of a table)", file=sys.stderr)
+        _fast_dump(headers, rows)
+        return
+    
+    # Stringify every cell once
+    cells = [tuple(map(str, row)) for row in rows]
+    header_row, row_fmt = _table_layout(headers, cells, max_width)
     
-    # Print rows
-    for row in rows:
-        row_str = " | ".join(str(val)[:w].ljust(w) for val, w in zip(row, col_widths))
-        print(row_str)
+    lines = [header_row, "-" * len(header_row)]
+    lines.extend(row_fmt.format(*row) for row in cells)
+    sys.stdout.write("\n".join(lines) + "\n")
+
+
+def print_cursor(cursor, max_width: int = 30, batch_size: int = FAST_DUMP_ROWS,
+                 as_csv: bool = False) -> int:
+    """Stream a cursor's result set as a table (or CSV), returning the row count
+    
+    Rows are pulled with fetchmany() so memory stays bounded by one batch.
+    Column widths come from the first batch; longer values in later batches
+    are truncated to those widths like any over-wide cell.
+    """
+    batch = cursor.fetchmany(batch_size)
+    if not batch:
+        return 0
+    
+    headers = [desc[0] for desc in cursor.description]
+    if as_csv:
+        writer = csv.writer(sys.stdout, lineterminator="\n")
+        writer.writerow(headers)
+        total = 0
+        while batch:
+            writer.writerows(batch)
+            total += len(batch)
+            batch = cursor.fetchmany(batch_size)
+        return total
+    
+    cells = [tuple(map(str, row)) for row in batch]
+    header_row, row_fmt = _table_layout(headers, cells, max_width)
+    
+    write = sys.stdout.write
+    write(header_row + "\n" + "-" * len(header_row) + "\n")
+    
+    total = 0
+    while batch:
+        write("".join(row_fmt.format(*map(str, row)) + "\n" for row in batch))
+        total += len(batch)
+        batch = cursor.fetchmany(batch_size)
+    return total
+
+
+# Labels for the counts returned by DATABASE_STATS_SQL, in column order
+STATS_LABELS = (
+    'Total Races',
+    'Total Runners',
+    'Unique Horses',
+    'Unique Trainers',
+    'Unique Jockeys',
+    'Unique Owners',
+)
+
 
+# ----------------------------------------------------------------------------
+# Fetchers: pure functions of (conn, args) returning tuples. The session
+# connection is read-only, so results are memoized for the whole session.
+# ----------------------------------------------------------------------------
+
+@lru_cache(maxsize=128)
+def fetch_database_stats(conn) -> Tuple:
+    """Return (min_date, max_date, unique_dates) and ((label, count), ...)"""
+    row = conn.execute(DATABASE_STATS_SQL).fetchone()
+    date_range, counts = row[:3], row[3:]
+    return date_range, tuple(zip(STATS_LABELS, counts))
+
+
+@lru_cache(maxsize=128)
+def fetch_races_by_date(conn, date: str) -> Tuple:
+    """Return the races run on a date, ordered by off time"""
+    return tuple(conn.execute(RACES_BY_DATE_SQL, (date,)).fetchall())
+
+
+@lru_cache(maxsize=128)
+def fetch_race_details(conn, race_id: str) -> Optional[Tuple]:
+    """Return (race_row, runner_rows) for a race, or None if not found"""
+    cursor = conn.cursor()
+    
+    cursor.execute(RACE_INFO_SQL, (race_id,))
+    race = cursor.fetchone()
+    if not race:
+        return None
+    
+    cursor.execute(RACE_RUNNERS_SQL, (race_id,))
+    return race, tuple(cursor.fetchall())
+
+
+@lru_cache(maxsize=128)
+def fetch_horse_details(conn, horse_name: str) -> Tuple:
+    """Return the fused horse-details rows (empty tuple if no match)"""
+    # FTS prefilter when usable; LIKE re-checked against the row
+    return tuple(search_rows(
+        conn, HORSE_DETAILS_SQL, 'horses_fts',
+        "h.rowid IN (SELECT rowid FROM horses_fts WHERE name LIKE ?) AND h.name LIKE ?",
+        "h.name LIKE ?", f"%{horse_name}%",
+    ))
+
+
+@lru_cache(maxsize=128)
+def fetch_recent_runs(conn, horse_id: str, before_date: Optional[str] = None,
+                      before_race_id: Optional[str] = None,
+                      limit: int = RECENT_RUNS_PAGE) -> Tuple:
+    """Return a page of a horse's runs, newest first, strictly before a cursor
+    
+    Pass the date and race_id of the last run on the previous page as
+    before_date/before_race_id to get the next page.
+    """
+    return tuple(conn.execute(
+        RECENT_RUNS_SQL, (horse_id, before_date, before_date, before_race_id, limit)
+    ).fetchall())
+
+
+@lru_cache(maxsize=128)
+def fetch_trainer_stats(conn, trainer_name: str) -> Tuple:
+    """Return the fused trainer-stats rows (empty tuple if no match)"""
+    return tuple(search_rows(
+        conn, TRAINER_STATS_SQL, 'trainers_fts',
+        "rowid IN (SELECT rowid FROM trainers_fts WHERE name LIKE ?) AND name LIKE ?",
+        "name LIKE ?", f"%{trainer_name}%",
+    ))
+
+
+@lru_cache(maxsize=128)
+def fetch_course_stats(conn, course_name: str) -> Tuple:
+    """Return ((course_row, recent_race_rows), ...) for matching courses"""
+    cursor = conn.cursor()
+    
+    # Resolve matching course names via the FTS index so the aggregate
+    # runs over idx_races_course rather than every race row
+    results = search_rows(
+        conn, COURSE_STATS_SQL, 'courses_fts',
+        "course IN (SELECT course FROM courses_fts WHERE course LIKE ?)",
+        "course LIKE ?", f"%{course_name}%",
+    )
+    
+    courses = []
+    for course in results:
+        cursor.execute(COURSE_RECENT_RACES_SQL, (course['course'],))
+        courses.append((course, tuple(cursor.fetchall())))
+    return tuple(courses)
+
+
+def clear_query_caches():
+    """Drop all memoized fetch_* results"""
+    for fetch in (fetch_database_stats, fetch_races_by_date, fetch_race_details,
+                  fetch_horse_details, fetch_recent_runs, fetch_trainer_stats,
+                  fetch_course_stats):
+        fetch.cache_clear()
+
+
+# ----------------------------------------------------------------------------
+# Renderers
+# ----------------------------------------------------------------------------
 
 def query_database_stats(conn):
     """Show database statistics"""
-    cursor = conn.cursor()
+    (min_date, max_date, unique_dates), counts = fetch_database_stats(conn)
     
     print("=" * 80)
     print("DATABASE STATISTICS")
     print("=" * 80)
     
-    # Date range
-    cursor.execute("SELECT MIN(date), MAX(date), COUNT(DISTINCT date) FROM races")
-    min_date, max_date, unique_dates = cursor.fetchone()
     print(f"\nDate Range: {min_date} to {max_date} ({unique_dates} days)")
     
-    # Total counts
-    tables = [
-        ('races', 'Total Races'),
-        ('runners', 'Total Runners'),
-        ('horses', 'Unique Horses'),
-        ('trainers', 'Unique Trainers'),
-        ('jockeys', 'Unique Jockeys'),
-        ('owners', 'Unique Owners')
-    ]
-    
     print("\nRecord Counts:")
-    for table, label in tables:
-        cursor.execute(f"SELECT COUNT(*) FROM {table}")
-        count = cursor.fetchone()[0]
+    for label, count in counts:
         print(f"  {label:20s}: {count:>8,}")
 
 
 def query_races_by_date(conn, date: str):
     """Get all races for a specific date"""
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        SELECT race_id, course, off_time, race_name, field_size
-        FROM races
-        WHERE date = ?
-        ORDER BY off_time
-    """, (date,))
-    
-    results = cursor.fetchall()
+    results = fetch_races_by_date(conn, date)
     
     if not results:
         print(f"No races found for {date}")
@@ -98,170 +495,102 @@ def query_races_by_date(conn, date: str):
 
 def query_race_details(conn, race_id: str):
     """Get detailed information about a specific race"""
-    cursor = conn.cursor()
-    
-    # Race info
-    cursor.execute("""
-        SELECT date, course, off_time, race_name, distance, going, 
-               surface, race_class, field_size
-        FROM races
-        WHERE race_id = ?
-    """, (race_id,))
-    
-    race = cursor.fetchone()
-    if not race:
+    details = fetch_race_details(conn, race_id)
+    if not details:
         print(f"Race {race_id} not found")
         return
     
+    race, runners = details
     print(f"\n{'=' * 80}")
     print(f"RACE DETAILS: {race_id}")
     print('=' * 80)
-    print(f"Date: {race[0]}")
-    print(f"Course: {race[1]}")
-    print(f"Time: {race[2]}")
-    print(f"Race Name: {race[3]}")
-    print(f"Distance: {race[4]}")
-    print(f"Going: {race[5]}")
-    print(f"Surface: {race[6]}")
-    print(f"Class: {race[7]}")
-    print(f"Field Size: {race[8]}")
+    print(f"Date: {race['date']}")
+    print(f"Course: {race['course']}")
+    print(f"Time: {race['off_time']}")
+    print(f"Race Name: {race['race_name']}")
+    print(f"Distance: {race['distance']}")
+    print(f"Going: {race['going']}")
+    print(f"Surface: {race['surface']}")
+    print(f"Class: {race['race_class']}")
+    print(f"Field Size: {race['field_size']}")
     
     # Runners
-    cursor.execute("""
-        SELECT 
-            ru.number,
-            h.name,
-            t.name,
-            j.name,
-            ru.draw,
-            ru.lbs
-        FROM runners ru
-        LEFT JOIN horses h ON ru.horse_id = h.horse_id
-        LEFT JOIN trainers t ON ru.trainer_id = t.trainer_id
-        LEFT JOIN jockeys j ON ru.jockey_id = j.jockey_id
-        WHERE ru.race_id = ?
-        ORDER BY CAST(ru.number AS INTEGER)
-    """, (race_id,))
-    
-    runners = cursor.fetchall()
     print(f"\n{'=' * 80}")
     print("RUNNERS")
     print('=' * 80)
     print_table(['No.', 'Horse', 'Trainer', 'Jockey', 'Draw', 'Weight'], runners)
 
 
-def query_horse_details(conn, horse_name: str):
-    """Get detailed information about a horse"""
-    cursor = conn.cursor()
-    
-    # Horse info
-    cursor.execute("""
-        SELECT 
-            h.horse_id,
-            h.name,
-            h.age,
-            h.sex,
-            h.colour,
-            d.name as dam,
-            s.name as sire,
-            ds.name as damsire,
-            t.name as current_trainer
-        FROM horses h
-        LEFT JOIN dams d ON h.dam_id = d.dam_id
-        LEFT JOIN sires s ON h.sire_id = s.sire_id
-        LEFT JOIN damsires ds ON h.damsire_id = ds.damsire_id
-        LEFT JOIN runners ru ON h.horse_id = ru.horse_id
-        LEFT JOIN trainers t ON ru.trainer_id = t.trainer_id
-        WHERE h.name LIKE ?
-        LIMIT 1
-    """, (f"%{horse_name}%",))
-    
-    horse = cursor.fetchone()
-    if not horse:
+def query_horse_details(conn, horse_name: str) -> Optional[Tuple[str, str, str]]:
+    """Get detailed information about a horse
+    
+    Returns (horse_id, last_date, last_race_id) as the cursor for older runs when a full
+    page of runs was shown, otherwise None.
+    """
+    rows = fetch_horse_details(conn, horse_name)
+    if not rows:
         print(f"Horse matching '{horse_name}' not found")
-        return
+        return None
     
+    horse = rows[0]
     print(f"\n{'=' * 80}")
-    print(f"HORSE DETAILS: {horse[1]}")
+    print(f"HORSE DETAILS: {horse['name']}")
     print('=' * 80)
-    print(f"Horse ID: {horse[0]}")
-    print(f"Age: {horse[2]}")
-    print(f"Sex: {horse[3]}")
-    print(f"Colour: {horse[4]}")
-    print(f"Dam (Mother): {horse[5]}")
-    print(f"Sire (Father): {horse[6]}")
-    print(f"Damsire: {horse[7]}")
-    print(f"Current Trainer: {horse[8]}")
-    
-    # Recent runs
-    cursor.execute("""
-        SELECT 
-            r.date,
-            r.course,
-            r.race_name,
-            ru.number
-        FROM runners ru
-        JOIN races r ON ru.race_id = r.race_id
-        WHERE ru.horse_id = ?
-        ORDER BY r.date DESC
-        LIMIT 10
-    """, (horse[0],))
-    
-    runs = cursor.fetchall()
+    print(f"Horse ID: {horse['horse_id']}")
+    print(f"Age: {horse['age']}")
+    print(f"Sex: {horse['sex']}")
+    print(f"Colour: {horse['colour']}")
+    print(f"Dam (Mother): {horse['dam']}")
+    print(f"Sire (Father): {horse['sire']}")
+    print(f"Damsire: {horse['damsire']}")
+    print(f"Current Trainer: {horse['current_trainer']}")
+    
+    # Recent runs (a horse with no runs comes back as one row with NULL run columns)
+    runs = [row for row in rows if row['run_horse_id'] is not None]
     print(f"\n{'=' * 80}")
     print("RECENT RUNS")
     print('=' * 80)
-    print_table(['Date', 'Course', 'Race', 'No.'], runs)
+    print_table(['Date', 'Course', 'Race', 'No.'],
+                [(run['date'], run['course'], run['race_name'], run['number']) for run in runs])
+    
+    if len(runs) < RECENT_RUNS_PAGE:
+        return None
+    return horse['horse_id'], runs[-1]['date'], runs[-1]['race_id']
+
+
+def query_older_runs(conn, horse_id: str, before_date: str,
+                     before_race_id: str) -> Optional[Tuple[str, str, str]]:
+    """Show the next page of a horse's runs before a cursor, returning the next cursor"""
+    runs = fetch_recent_runs(conn, horse_id, before_date, before_race_id)
+    print(f"\n{'=' * 80}")
+    print(f"RUNS BEFORE {before_date}")
+    print('=' * 80)
+    print_table(['Date', 'Course', 'Race', 'No.'],
+                [(run['date'], run['course'], run['race_name'], run['number']) for run in runs])
+    
+    if len(runs) < RECENT_RUNS_PAGE:
+        return None
+    return horse_id, runs[-1]['date'], runs[-1]['race_id']
 
 
 def query_trainer_stats(conn, trainer_name: str):
     """Get statistics for a trainer"""
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        SELECT trainer_id, name, location
-        FROM trainers
-        WHERE name LIKE ?
-        LIMIT 1
-    """, (f"%{trainer_name}%",))
-    
-    trainer = cursor.fetchone()
-    if not trainer:
+    rows = fetch_trainer_stats(conn, trainer_name)
+    if not rows:
         print(f"Trainer matching '{trainer_name}' not found")
         return
     
+    trainer = rows[0]
     print(f"\n{'=' * 80}")
-    print(f"TRAINER: {trainer[1]}")
+    print(f"TRAINER: {trainer['name']}")
     print('=' * 80)
-    print(f"Trainer ID: {trainer[0]}")
-    print(f"Location: {trainer[2]}")
+    print(f"Trainer ID: {trainer['trainer_id']}")
+    print(f"Location: {trainer['location']}")
+    print(f"Runners in dataset: {trainer['runner_count']}")
     
-    # Runner count
-    cursor.execute("""
-        SELECT COUNT(*)
-        FROM runners
-        WHERE trainer_id = ?
-    """, (trainer[0],))
-    
-    runner_count = cursor.fetchone()[0]
-    print(f"Runners in dataset: {runner_count}")
-    
-    # Recent runners
-    cursor.execute("""
-        SELECT 
-            r.date,
-            r.course,
-            h.name,
-            r.race_name
-        FROM runners ru
-        JOIN races r ON ru.race_id = r.race_id
-        JOIN horses h ON ru.horse_id = h.horse_id
-        WHERE ru.trainer_id = ?
-        ORDER BY r.date DESC
-        LIMIT 10
-    """, (trainer[0],))
-    
-    recent_runners = cursor.fetchall()
+    # Recent runners (a trainer with no runners comes back as one row with NULL run columns)
+    recent_runners = [(row['date'], row['course'], row['horse'], row['race_name'])
+                      for row in rows if row['run_trainer_id'] is not None]
     print(f"\n{'=' * 80}")
     print("RECENT RUNNERS")
     print('=' * 80)
@@ -270,47 +599,86 @@ def query_trainer_stats(conn, trainer_name: str):
 
 def query_course_stats(conn, course_name: str):
     """Get statistics for a course"""
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        SELECT 
-            course,
-            COUNT(*) as race_count,
-            MIN(date) as first_race,
-            MAX(date) as last_race
-        FROM races
-        WHERE course LIKE ?
-        GROUP BY course
-    """, (f"%{course_name}%",))
+    courses = fetch_course_stats(conn, course_name)
     
-    results = cursor.fetchall()
-    
-    if not results:
+    if not courses:
         print(f"Course matching '{course_name}' not found")
         return
     
     print(f"\n{'=' * 80}")
     print("COURSE STATISTICS")
     print('=' * 80)
-    print_table(['Course', 'Races', 'First Date', 'Last Date'], results)
+    print_table(['Course', 'Races', 'First Date', 'Last Date'], [course for course, _ in courses])
     
     # Sample races
-    for course in results:
-        cursor.execute("""
-            SELECT date, race_name, field_size
-            FROM races
-            WHERE course = ?
-            ORDER BY date DESC
-            LIMIT 5
-        """, (course[0],))
-        
-        races = cursor.fetchall()
+    for course, races in courses:
         print(f"\n{'=' * 80}")
-        print(f"RECENT RACES AT {course[0]}")
+        print(f"RECENT RACES AT {course['course']}")
         print('=' * 80)
         print_table(['Date', 'Race Name', 'Field'], races)
 
 
+def query_horse_history(conn, horse_name: str):
+    """Horse details, then older runs page by page while the user asks for more"""
+    page = query_horse_details(conn, horse_name)
+    while page and input("\nShow older runs? (y/N): ").strip().lower() == "y":
+        page = query_older_runs(conn, *page)
+
+
+def run_custom_query(conn):
+    """Read a multi-line SQL statement and stream its result"""
+    print("\nEnter your SQL query (press Enter twice to execute):")
+    lines = []
+    while True:
+        line = input()
+        if not line:
+            break
+        lines.append(line)
+    
+    query = " ".join(lines)
+    if not query:
+        return
+    if not sqlite3.complete_statement(query.rstrip().rstrip(';') + ';'):
+        print("Error: incomplete SQL statement (unterminated string, comment or trigger)")
+        return
+    as_csv = input("Output as CSV? (y/N): ").strip().lower() == "y"
+    
+    try:
+        cursor = conn.cursor()
+        # The connection is read-only (mode=ro, query_only), so any write is
+        # rejected here and the memoized fetchers never go stale
+        cursor.execute(query)
+        
+        # Stream the result rather than fetchall() so a large
+        # SELECT never sits in memory as a whole
+        total_rows = print_cursor(cursor, as_csv=as_csv)
+        if total_rows:
+            print(f"\nTotal rows: {total_rows}")
+        else:
+            print("Query executed successfully (no results)")
+    except Exception as e:
+        print(f"Error: {e}")
+
+
+def parse_date(text: str) -> str:
+    """Validate a YYYY-MM-DD date, returning it unchanged"""
+    datetime.strptime(text, "%Y-%m-%d")
+    return text
+
+
+# Menu option -> (label, handler, [(prompt, parser), ...]). Each handler is
+# called as handler(conn, *parsed_inputs).
+MENU = {
+    "1": ("Database Statistics", query_database_stats, ()),
+    "2": ("Races by Date", query_races_by_date, (("Enter date (YYYY-MM-DD)", parse_date),)),
+    "3": ("Race Details", query_race_details, (("Enter race ID", str),)),
+    "4": ("Horse Details", query_horse_history, (("Enter horse name (partial match OK)", str),)),
+    "5": ("Trainer Statistics", query_trainer_stats, (("Enter trainer name (partial match OK)", str),)),
+    "6": ("Course Statistics", query_course_stats, (("Enter course name (partial match OK)", str),)),
+    "7": ("Custom SQL Query", run_custom_query, ()),
+}
+
+
 def main():
     """Main interactive menu"""
     conn = connect_db()
@@ -319,13 +687,9 @@ def main():
         print("\n" + "=" * 80)
         print("RACECARDS PRO DATABASE - QUERY TOOL")
         print("=" * 80)
-        print("\n1. Database Statistics")
-        print("2. Races by Date")
-        print("3. Race Details")
-        print("4. Horse Details")
-        print("5. Trainer Statistics")
-        print("6. Course Statistics")
-        print("7. Custom SQL Query")
+        print()
+        for key, (label, _, _) in MENU.items():
+            print(f"{key}. {label}")
         print("0. Exit")
         
         choice = input("\nEnter your choice: ").strip()
@@ -333,50 +697,18 @@ def main():
         if choice == "0":
             print("Goodbye!")
             break
-        elif choice == "1":
-            query_database_stats(conn)
-        elif choice == "2":
-            date = input("Enter date (YYYY-MM-DD): ").strip()
-            query_races_by_date(conn, date)
-        elif choice == "3":
-            race_id = input("Enter race ID: ").strip()
-            query_race_details(conn, race_id)
-        elif choice == "4":
-            horse_name = input("Enter horse name (partial match OK): ").strip()
-            query_horse_details(conn, horse_name)
-        elif choice == "5":
-            trainer_name = input("Enter trainer name (partial match OK): ").strip()
-            query_trainer_stats(conn, trainer_name)
-        elif choice == "6":
-            course_name = input("Enter course name (partial match OK): ").strip()
-            query_course_stats(conn, course_name)
-        elif choice == "7":
-            print("\nEnter your SQL query (press Enter twice to execute):")
-            lines = []
-            while True:
-                line = input()
-                if not line:
-                    break
-                lines.append(line)
-            
-            query = " ".join(lines)
-            if query:
-                try:
-                    cursor = conn.cursor()
-                    cursor.execute(query)
-                    results = cursor.fetchall()
-                    
-                    if results:
-                        # Get column names
-                        headers = [desc[0] for desc in cursor.description]
-                        print_table(headers, results)
-                        print(f"\nTotal rows: {len(results)}")
-                    else:
-                        print("Query executed successfully (no results)")
-                except Exception as e:
-                    print(f"Error: {e}")
-        else:
+        
+        entry = MENU.get(choice)
+        if entry is None:
             print("Invalid choice. Please try again.")
+        else:
+            _, handler, prompts = entry
+            try:
+                args = [parse(input(f"{prompt}: ").strip()) for prompt, parse in prompts]
+            except ValueError as e:
+                print(f"Invalid input: {e}")
+            else:
+                handler(conn, *args)
         
         input("\nPress Enter to continue...")
     
@@ -385,4 +717,3 @@ def main():
 
 if __name__ == "__main__":
     main()
-
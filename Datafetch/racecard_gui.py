@@ -14,8 +14,6 @@ from PySide6.QtGui import QFont
 # Add parent directory to path for imports
 sys.path.insert(0, str(Path(__file__).parent))
 
-from gui.dashboard_window import DashboardWindow
-
 
 def main():
     """Main application entry point"""
@@ -34,7 +32,10 @@ def main():
     
     # Note: High DPI scaling is automatic in Qt 6.10+, no need to set attributes
     
-    # Create and show dashboard window
+    # Create and show dashboard window. Imported here, once the QApplication
+    # exists, so the heavy dashboard import chain (views, pandas, ML) is not
+    # paid before Qt has even parsed its arguments
+    from gui.dashboard_window import DashboardWindow
     window = DashboardWindow()
     window.show()
     
@@ -10,46 +10,60 @@ import sys
 DB_PATH = Path(__file__).parent / "racing_pro.db"
 
 
-def test_schema():
-    """Test that new schema elements exist"""
+def connect_db():
+    """Open a read-only connection with the same PRAGMA tuning as query_racecards"""
+    conn = sqlite3.connect(f"{DB_PATH.resolve().as_uri()}?mode=ro", uri=True)
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-131072")
+    conn.execute("PRAGMA mmap_size=268435456")
+    conn.execute("PRAGMA query_only=1")
+    return conn
+
+
+def table_columns(conn, table: str) -> frozenset:
+    """Column names of a table"""
+    return frozenset(row[0] for row in conn.execute("SELECT name FROM pragma_table_info(?)", (table,)))
+
+
+def test_schema(conn):
+    """Test that new schema elements exist (raises AssertionError if not)"""
     print("="*60)
     print("TESTING SCHEMA")
     print("="*60)
     
-    conn = sqlite3.connect(str(DB_PATH))
     cursor = conn.cursor()
     
     # Check for new tables
     print("\nChecking new tables...")
+    new_tables = ['runner_odds', 'runner_market_odds']
     cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name IN ('runner_odds', 'runner_market_odds')")
-    tables = [row[0] for row in cursor.fetchall()]
+    tables = {row[0] for row in cursor.fetchall()}
+    
+    # Row counts for every table that exists, in one UNION ALL statement
+    counts = {}
+    present = [table for table in new_tables if table in tables]
+    if present:
+        cursor.execute(" UNION ALL ".join(
+            f"SELECT '{table}', (SELECT COUNT(*) FROM {table})" for table in present
+        ))
+        counts = dict(cursor.fetchall())
     
-    for table in ['runner_odds', 'runner_market_odds']:
-        if table in tables:
-            cursor.execute(f"SELECT COUNT(*) FROM {table}")
-            count = cursor.fetchone()[0]
-            print(f"  ✓ {table}: {count:,} rows")
-        else:
-            print(f"  ✗ {table}: NOT FOUND")
-            return False
+    for table in new_tables:
+        assert table in counts, f"{table}: NOT FOUND"
+        print(f"  ✓ {table}: {counts[table]:,} rows")
     
     # Check new columns in runners table
     print("\nChecking new runner columns...")
-    cursor.execute("PRAGMA table_info(runners)")
-    runner_cols = {row[1] for row in cursor.fetchall()}
+    runner_cols = table_columns(conn, 'runners')
     
     new_cols = ['age', 'sex_code', 'sire', 'trainer_14d_runs', 'trainer_14d_wins', 'trainer_14d_percent']
     for col in new_cols:
-        if col in runner_cols:
-            print(f"  ✓ {col}")
-        else:
-            print(f"  ✗ {col} NOT FOUND")
-            return False
+        assert col in runner_cols, f"runners.{col} NOT FOUND"
+        print(f"  ✓ {col}")
     
     # Check new columns in ml_features table
     print("\nChecking new ml_features columns...")
-    cursor.execute("PRAGMA table_info(ml_features)")
-    feature_cols = {row[1] for row in cursor.fetchall()}
+    feature_cols = table_columns(conn, 'ml_features')
     
     new_feature_cols = [
         'odds_implied_prob', 'odds_is_favorite', 'odds_favorite_rank', 'odds_decimal',
@@ -57,34 +71,49 @@ def test_schema():
         'trainer_14d_runs', 'trainer_14d_wins', 'trainer_14d_win_pct', 'trainer_is_hot'
     ]
     for col in new_feature_cols:
-        if col in feature_cols:
-            print(f"  ✓ {col}")
-        else:
-            print(f"  ✗ {col} NOT FOUND")
-            return False
-    
-    conn.close()
-    return True
+        assert col in feature_cols, f"ml_features.{col} NOT FOUND"
+        print(f"  ✓ {col}")
 
 
-def test_data_population():
+def test_data_population(conn):
     """Test that we have data in new fields"""
     print("\n" + "="*60)
     print("TESTING DATA POPULATION")
     print("="*60)
     
-    conn = sqlite3.connect(str(DB_PATH))
     cursor = conn.cursor()
     
-    # Check runner_odds table
-    print("\nChecking runner_odds table...")
+    # All per-table stats in one statement: each table is aggregated in a
+    # single pass and the three one-row results come back together
     cursor.execute("""
-        SELECT COUNT(*) as total,
-               COUNT(DISTINCT runner_id) as unique_runners,
-               COUNT(DISTINCT bookmaker) as unique_bookmakers
-        FROM runner_odds
+        WITH odds AS (
+            SELECT COUNT(*) as total,
+                   COUNT(DISTINCT runner_id) as unique_runners,
+                   COUNT(DISTINCT bookmaker) as unique_bookmakers
+            FROM runner_odds
+        ),
+        market AS (
+            SELECT COUNT(*) as total,
+                   AVG(avg_decimal) as avg_odds,
+                   AVG(bookmaker_count) as avg_bookmakers
+            FROM runner_market_odds
+        ),
+        runner_fields AS (
+            SELECT 
+                COUNT(*) as total,
+                COUNT(age) as with_age,
+                COUNT(sex_code) as with_sex_code,
+                COUNT(trainer_14d_runs) as with_trainer_14d
+            FROM runners
+        )
+        SELECT * FROM odds, market, runner_fields
     """)
-    row = cursor.fetchone()
+    stats = cursor.fetchone()
+    odds_stats, market_stats, runner_stats = stats[0:3], stats[3:6], stats[6:10]
+    
+    # Check runner_odds table
+    print("\nChecking runner_odds table...")
+    row = odds_stats
     print(f"  Total odds records: {row[0]:,}")
     print(f"  Unique runners with odds: {row[1]:,}")
     print(f"  Unique bookmakers: {row[2]:,}")
@@ -101,28 +130,14 @@ def test_data_population():
     
     # Check runner_market_odds table
     print("\nChecking runner_market_odds table...")
-    cursor.execute("""
-        SELECT COUNT(*) as total,
-               AVG(avg_decimal) as avg_odds,
-               AVG(bookmaker_count) as avg_bookmakers
-        FROM runner_market_odds
-    """)
-    row = cursor.fetchone()
+    row = market_stats
     print(f"  Runners with market odds: {row[0]:,}")
     print(f"  Average decimal odds: {row[1]:.2f}" if row[1] else "  No data yet")
     print(f"  Average bookmakers per runner: {row[2]:.1f}" if row[2] else "  No data yet")
     
     # Check new runner fields
     print("\nChecking new runner fields...")
-    cursor.execute("""
-        SELECT 
-            COUNT(*) as total,
-            COUNT(age) as with_age,
-            COUNT(sex_code) as with_sex_code,
-            COUNT(trainer_14d_runs) as with_trainer_14d
-        FROM runners
-    """)
-    row = cursor.fetchone()
+    row = runner_stats
     total = row[0]
     print(f"  Total runners: {total:,}")
     print(f"  With age: {row[1]:,} ({row[1]/total*100:.1f}%)" if total > 0 else "  No runners")
@@ -139,18 +154,14 @@ def test_data_population():
     print("\n  Sample runner demographics & trainer form:")
     for row in cursor.fetchall():
         print(f"    Age: {row[0]}, Sex: {row[1]}, Trainer 14d: {row[2]}/{row[3]} ({row[4]}%)" if row[4] else f"    Age: {row[0]}, Sex: {row[1]}")
-    
-    conn.close()
-    return True
 
 
-def test_feature_generation():
-    """Test that feature generation works with new features"""
+def test_feature_generation(conn):
+    """Test that feature generation works with new features (raises on failure)"""
     print("\n" + "="*60)
     print("TESTING FEATURE GENERATION")
     print("="*60)
     
-    conn = sqlite3.connect(str(DB_PATH))
     cursor = conn.cursor()
     
     # Get a race with results
@@ -164,10 +175,7 @@ def test_feature_generation():
     """)
     
     row = cursor.fetchone()
-    if not row:
-        print("  ⚠ No races with results found for testing")
-        conn.close()
-        return False
+    assert row, "No races with results found for testing"
     
     race_id = row[0]
     race_date = row[1]
@@ -203,22 +211,16 @@ def test_feature_generation():
     
     # Test feature computation
     print("\n  Testing feature computation...")
+    sys.path.append(str(Path(__file__).parent))
+    from ml.feature_engineer import FeatureEngineer
+    
+    engineer = FeatureEngineer(DB_PATH)
+    engineer.connect()
     try:
-        sys.path.append(str(Path(__file__).parent))
-        from ml.feature_engineer import FeatureEngineer
-        
-        engineer = FeatureEngineer(DB_PATH)
-        engineer.connect()
-        
         # Get race context and runners
         race_context = engineer.get_race_context_features(race_id)
         runners = engineer.get_runners_for_race(race_id)
-        
-        if not runners:
-            print("    ⚠ No runners found")
-            engineer.close()
-            conn.close()
-            return False
+        assert runners, f"No runners found for race {race_id}"
         
         print(f"    Processing {len(runners)} runners...")
         
@@ -238,19 +240,10 @@ def test_feature_generation():
         for feat in new_features_check:
             value = features.get(feat)
             print(f"    {feat}: {value}")
-        
+    finally:
         engineer.close()
-        print("\n  ✓ Feature generation successful!")
-        
-    except Exception as e:
-        print(f"\n  ✗ Feature generation failed: {e}")
-        import traceback
-        traceback.print_exc()
-        conn.close()
-        return False
     
-    conn.close()
-    return True
+    print("\n  ✓ Feature generation successful!")
 
 
 def main():
@@ -270,16 +263,22 @@ def main():
         ("Feature Generation", test_feature_generation),
     ]
     
+    # One connection for all tests so later tests reuse its warm page cache
+    conn = connect_db()
     results = []
     for test_name, test_func in tests:
         try:
-            result = test_func()
-            results.append((test_name, result))
+            test_func(conn)
+            results.append((test_name, True))
+        except AssertionError as e:
+            print(f"\n  ✗ {e}")
+            results.append((test_name, False))
         except Exception as e:
             print(f"\n✗ {test_name} test failed with exception: {e}")
             import traceback
             traceback.print_exc()
             results.append((test_name, False))
+    conn.close()
     
     # Summary
     print("\n" + "="*60)